@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Request, HTTPException, Query
+from typing import Annotated
+
+router = APIRouter()
+
+
+@router.get("/admin/slow-queries",
+            response_description="Most recent slow aggregations, newest first.")
+async def get_slow_queries(request: Request,
+                           limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+                           route: str | None = None):
+    recorder = getattr(request.app, 'slow_queries', None)
+    if recorder is None:
+        raise HTTPException(status_code=404, detail='Slow query recording is disabled')
+    return recorder.read(limit, route)
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from dotenv import dotenv_values
+from pymongo import MongoClient
+
+from benchmarks.generate_data import generate
+
+config = dotenv_values(".env")
+
+
+def run_ingestion(data_route: str, profile_route: str, db_name: str, batch_size: int, chunk_size: int | None):
+    command = [sys.executable, 'data_insertion_script.py', data_route, '--batch-size', str(batch_size),
+               '--profile', profile_route, '--db-name', db_name]
+    if chunk_size is not None:
+        command += ['--chunk-size', str(chunk_size)]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    with open(profile_route) as profile_file:
+        return json.load(profile_file)
+
+
+def run(sizes: list, batch_sizes: list, chunk_size: int | None, years: list, db_name: str, seed: int) -> list:
+    client = MongoClient(config["ADDRESS"], 27017)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            data_route = os.path.join(workdir, f'prices_{rows}.csv')
+            generate(data_route, rows, years, seed)
+            for batch_size in batch_sizes:
+                client.drop_database(db_name)
+                profile = run_ingestion(data_route, os.path.join(workdir, 'profile.json'), db_name, batch_size,
+                                        chunk_size)
+                results.append(profile)
+                print(f'{rows} rows, batch_size={batch_size}: {profile["rows_per_sec"]:.0f} rows/sec',
+                      file=sys.stderr)
+    client.drop_database(db_name)
+    client.close()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile begin() against generated datasets of several sizes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10000])
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--years', type=int, nargs='+', default=[2023, 2024])
+    parser.add_argument('--db-name', default='seasonalfoods_bench')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.sizes, args.batch_sizes, args.chunk_size, args.years, args.db_name, args.seed),
+                        indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
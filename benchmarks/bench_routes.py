@@ -0,0 +1,169 @@
+import argparse
+import datetime
+import json
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.generate_data import load_products
+
+API_PREFIX = '/seasonal-foods/api/v1'
+CACHE_BACKENDS = ('none', 'memory')
+
+
+def endpoint_requests(rng: random.Random, year: int) -> dict:
+    products = [name for name, _ in load_products()]
+    month = datetime.date.today().month
+    return {
+        'get_foods': lambda: '/',
+        'advanced_food_search': lambda: f'/foods_search/year/{year}/?' + urllib.parse.urlencode(
+            {'region': rng.randint(1, 9), 'week_gte': 1, 'week_lte': 53}),
+        'get_food_history_last_weeks': lambda: f'/product/{urllib.parse.quote(rng.choice(products))}/',
+        'testtt': lambda: f'/per_region/product/{urllib.parse.quote(rng.choice(products))}/',
+        'get_food_history': lambda: f'/year/{year}/product/{urllib.parse.quote(rng.choice(products))}/?' +
+                                    urllib.parse.urlencode({'week_gte': 1, 'week_lte': 53}),
+        'get_foods_in_season': lambda: f'/seasonal/month/{month}/region/{rng.randint(1, 9)}',
+        'get_foods_in_zone': lambda: '/seasonal/zone/zone/harvest_months?' + urllib.parse.urlencode(
+            {'zone': rng.choice(['Zona Norte', 'Zona Centro', 'Zona Sur']), 'harvest_months': month}),
+        'get_basket_history': lambda: ('/products/history/', {'products': rng.sample(products, 5)}),
+        'export_history': lambda: f'/export/weekly_prices/year/{year}/?' + urllib.parse.urlencode(
+            {'product': rng.choice(products)}),
+    }
+
+
+def timed_request(call: tuple) -> tuple:
+    url, body = call
+    request = urllib.request.Request(url, data=None if body is None else json.dumps(body).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    return time.perf_counter() - start, status
+
+
+def bench_endpoint(base_url: str, make_request, requests: int, concurrency: int) -> dict:
+    # Endpoints produce either a path to GET or a (path, JSON body) pair to POST.
+    calls = []
+    for _ in range(requests):
+        call = make_request()
+        path, body = (call, None) if isinstance(call, str) else call
+        calls.append((base_url + API_PREFIX + path, body))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_request, calls))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, status in results if status >= 500),
+        'throughput_rps': requests / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max()),
+    }
+
+
+def run(base_url: str, year: int, requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    report = {'base_url': base_url, 'year': year, 'started_at': datetime.datetime.now().isoformat(),
+              'endpoints': {}}
+    for name, make_request in endpoint_requests(rng, year).items():
+        if warmup:
+            bench_endpoint(base_url, make_request, warmup, concurrency)
+        report['endpoints'][name] = bench_endpoint(base_url, make_request, requests, concurrency)
+    return report
+
+
+def serve(db_name: str, cache_backend: str, port: int):
+    import uvicorn
+
+    import main
+    main.config.update({'DB_NAME': db_name, 'CACHE_BACKEND': cache_backend})
+    uvicorn.run(main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def start_server(db_name: str, cache_backend: str, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_routes', '--serve', '--db-name', db_name,
+                               '--cache-backend', cache_backend, '--port', str(port)])
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/'):
+                return server
+        except OSError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f'API server for {db_name} did not start on port {port}')
+
+
+def run_local(db_name: str, cache_backends: list, port: int, year: int, requests: int, concurrency: int,
+              warmup: int, seed: int) -> dict:
+    report = {'db_name': db_name, 'runs': {}}
+    for cache_backend in cache_backends:
+        server = start_server(db_name, cache_backend, port)
+        try:
+            report['runs'][cache_backend] = run(f'http://127.0.0.1:{port}', year, requests, concurrency, warmup,
+                                                seed)
+        finally:
+            server.terminate()
+            server.wait()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure latency percentiles and throughput for every route.')
+    parser.add_argument('--base-url', help='Benchmark an already running server instead of starting one per '
+                                           'cache backend against --db-name.')
+    parser.add_argument('--db-name', default='seasonalfoods_bench')
+    parser.add_argument('--cache-backends', nargs='+', choices=CACHE_BACKENDS, default=list(CACHE_BACKENDS),
+                        help='Cache backends to start the server with; "none" measures the database path.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--year', type=int, default=datetime.date.today().year)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--load', help='Generate and ingest this many synthetic rows into --db-name before '
+                                       'benchmarking.', type=int)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--cache-backend', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.db_name, args.cache_backend, args.port)
+        sys.exit()
+
+    if args.load:
+        import data_insertion_script
+        from benchmarks.generate_data import generate
+        generate('bench_data.csv', args.load, [args.year - 1, args.year], args.seed)
+        data_insertion_script.begin('bench_data.csv', chunk_size=500000, db_name=args.db_name)
+
+    if args.base_url:
+        result = run(args.base_url, args.year, args.requests, args.concurrency, args.warmup, args.seed)
+    else:
+        result = run_local(args.db_name, args.cache_backends, args.port, args.year, args.requests, args.concurrency,
+                           args.warmup, args.seed)
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report)
+    else:
+        print(report)
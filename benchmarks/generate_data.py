@@ -0,0 +1,71 @@
+import argparse
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+
+from enums import Category, region_dict, point_dict, unit_metric_dict
+
+COLUMNS = ['Fecha', 'Anio', 'Semana', 'Region', 'Sector', 'Tipo_de_punto', 'Grupo', 'Producto', 'Variedad',
+           'Calidad', 'Unidad', 'PrecioMinimo', 'PrecioMaximo', 'PrecioPromedio']
+FRUITS = {'Cereza', 'Chirimoya', 'Ciruela', 'Damasco', 'Durazno', 'Frutilla', 'Kiwi', 'Limón', 'Mandarina', 'Mango',
+          'Manzana', 'Melón', 'Naranja', 'Palta', 'Pera', 'Sandía', 'Tuna', 'Uva'}
+QUALITIES = ['1a', '2a', 'Sin especificar']
+SECTORS = ['Sector Norte', 'Sector Centro', 'Sector Sur', 'Sector Oriente', 'Sector Poniente']
+VARIETIES = ['Sin especificar', 'Común', 'Hass', 'Granel']
+
+
+def load_products(harvest_route='seasonalfoods_db.harvest.json') -> list:
+    with open(harvest_route, encoding='utf-8') as harvest_file:
+        names = sorted({doc['ingredient_id'] for doc in json.load(harvest_file)})
+    return [(name, Category.FRUTAS.value if name in FRUITS else Category.HORTALIZAS.value) for name in names]
+
+
+def generate_chunk(rng, rows: int, products: list, years: list) -> pd.DataFrame:
+    weeks = [(year, week) for year in years
+             for week in range(1, datetime.date(year, 12, 28).isocalendar()[1] + 1)]
+    week_choice = rng.integers(len(weeks), size=rows)
+    product_choice = rng.integers(len(products), size=rows)
+    dates = [datetime.date.fromisocalendar(*weeks[i], 1) for i in week_choice]
+
+    minimum = rng.integers(200, 3000, size=rows)
+    maximum = minimum + rng.integers(0, 2000, size=rows)
+    mean = minimum + (maximum - minimum) * rng.random(rows)
+    return pd.DataFrame({
+        'Fecha': [day.strftime('%d/%m/%Y 00:00:00') for day in dates],
+        'Anio': [weeks[i][0] for i in week_choice],
+        'Semana': [weeks[i][1] for i in week_choice],
+        'Region': rng.choice([region.value for region in region_dict.values()], size=rows),
+        'Sector': rng.choice(SECTORS, size=rows),
+        'Tipo_de_punto': rng.choice([point.value for point in point_dict.values()], size=rows),
+        'Grupo': [products[i][1] for i in product_choice],
+        'Producto': [products[i][0] for i in product_choice],
+        'Variedad': rng.choice(VARIETIES, size=rows),
+        'Calidad': rng.choice(QUALITIES, size=rows),
+        'Unidad': rng.choice(list(unit_metric_dict.values()), size=rows),
+        'PrecioMinimo': minimum,
+        'PrecioMaximo': maximum,
+        'PrecioPromedio': np.char.replace(np.round(mean, 2).astype(str), '.', ','),
+    }, columns=COLUMNS)
+
+
+def generate(output: str, rows: int, years: list, seed: int = 0, chunk_size: int = 500000):
+    rng = np.random.default_rng(seed)
+    products = load_products()
+    written = 0
+    while written < rows:
+        chunk = generate_chunk(rng, min(chunk_size, rows - written), products, years)
+        chunk.to_csv(output, sep='|', index=False, header=written == 0, mode='w' if written == 0 else 'a')
+        written += len(chunk)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic ODEPA price file in the schema begin() reads.')
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--years', type=int, nargs='+', default=[datetime.date.today().year])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(f'Wrote {generate(args.output, args.rows, args.years, args.seed)} rows to {args.output}')
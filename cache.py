@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from bson import json_util
+from starlette.concurrency import run_in_threadpool
+
+
+class LRUCache:
+    blocking = False
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    blocking = True
+
+    def __init__(self, url: str, ttl: float = 3600.0, prefix: str = 'seasonalfoods:', timeout: float = 1.0):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.errors = redis.RedisError
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        try:
+            value = self.client.get(self.prefix + key)
+        except self.errors as error:
+            print(f'WARNING: redis cache read failed: {error!r}')
+            return None
+        if value is None:
+            return None
+        return json_util.loads(value)
+
+    def set(self, key: str, value):
+        try:
+            self.client.setex(self.prefix + key, self.ttl, json_util.dumps(value))
+        except self.errors as error:
+            print(f'WARNING: redis cache write failed: {error!r}')
+
+    def clear(self):
+        try:
+            for key in self.client.scan_iter(match=self.prefix + '*'):
+                self.client.delete(key)
+        except self.errors as error:
+            print(f'WARNING: redis cache clear failed: {error!r}')
+
+
+def create_cache(config):
+    backend = config.get('CACHE_BACKEND', 'memory').lower()
+    ttl = float(config.get('CACHE_TTL', 3600))
+    if backend == 'none':
+        return None
+    if backend == 'redis':
+        return RedisCache(config.get('REDIS_URL', 'redis://localhost:6379/0'), ttl=ttl)
+    return LRUCache(max_size=int(config.get('CACHE_MAX_SIZE', 1024)), ttl=ttl)
+
+
+def cache_key(route: str, version: int, params: dict) -> str:
+    return json.dumps([route, version, params], sort_keys=True, default=str)
+
+
+async def _call(response_cache, method, *args):
+    if response_cache.blocking:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+
+def cached(route: str):
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            app = kwargs['request'].app
+            response_cache = getattr(app, 'response_cache', None)
+            if response_cache is None:
+                return await endpoint(*args, **kwargs)
+
+            version = app.data_version.current()['version']
+            key = cache_key(route, version, {name: value for name, value in kwargs.items() if name not in ('request', 'response')})
+            result = await _call(response_cache, response_cache.get, key)
+            if result is None:
+                result = await endpoint(*args, **kwargs)
+                await _call(response_cache, response_cache.set, key, result)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,36 @@
+import unicodedata
+from bisect import bisect_left
+
+
+def normalize_name(name: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+class ProductCatalog:
+    def __init__(self, foods=()):
+        self.foods = {normalize_name(food['product_name']): food for food in foods}
+        self.names = sorted(self.foods)
+
+    @classmethod
+    def load(cls, db):
+        return cls(db['foods'].find({}, {'product_name': 1, 'group': 1}))
+
+    def with_prefix(self, prefix: str) -> list:
+        prefix = normalize_name(prefix)
+        matches = []
+        for name in self.names[bisect_left(self.names, prefix):]:
+            if not name.startswith(prefix):
+                break
+            matches.append(self.foods[name])
+        return matches
+
+    def resolve(self, product_name: str):
+        food = self.foods.get(normalize_name(product_name))
+        if food is not None:
+            return food
+        matches = self.with_prefix(product_name)
+        if len(matches) == 1:
+            return matches[0]
+        return None
@@ -0,0 +1,78 @@
+import hashlib
+from datetime import date, datetime, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+import pipeline_utils
+
+
+def window_start() -> datetime:
+    # Routes fall back to the last few weeks, the current month or the current year when the client does not
+    # pin them, so a representation is only valid from the latest week or month boundary onwards.
+    this_week = pipeline_utils.recent_weeks_start(weeks=0).date()
+    return datetime.combine(max(this_week, date.today().replace(day=1)), time.min, tzinfo=timezone.utc)
+
+
+def entity_tag(version: int, path: str, query_string: bytes, window: str = '') -> str:
+    query = b'&'.join(sorted(query_string.split(b'&'))) if query_string else b''
+    digest = hashlib.sha1(path.encode('utf-8') + b'?' + query + b'#' + window.encode('utf-8')).hexdigest()[:20]
+    return f'"{version}-{digest}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def _not_modified_since(if_modified_since: str, updated_at) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    try:
+        return updated_at.replace(microsecond=0) <= since
+    except TypeError:
+        return False
+
+
+class ConditionalGetMiddleware:
+    def __init__(self, app, prefixes: list, exclude: list | None = None):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.exclude = tuple(exclude or ())
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD')
+                or not scope['path'].startswith(self.prefixes) or scope['path'].startswith(self.exclude)):
+            return await self.app(scope, receive, send)
+
+        record = scope['app'].data_version.current()
+        window = window_start()
+        validators = {'ETag': entity_tag(record['version'], scope['path'], scope['query_string'],
+                                         window.date().isoformat())}
+        updated_at = record.get('updated_at')
+        if updated_at is not None:
+            updated_at = max(updated_at.replace(tzinfo=timezone.utc), window)
+            validators['Last-Modified'] = format_datetime(updated_at, usegmt=True)
+
+        request_headers = Headers(scope=scope)
+        if 'if-none-match' in request_headers:
+            not_modified = _matches(request_headers['if-none-match'], validators['ETag'])
+        else:
+            not_modified = (updated_at is not None and 'if-modified-since' in request_headers
+                            and _not_modified_since(request_headers['if-modified-since'], updated_at))
+        if not_modified:
+            return await Response(status_code=304, headers=validators)(scope, receive, send)
+
+        async def send_with_validators(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                MutableHeaders(scope=message).update(validators)
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
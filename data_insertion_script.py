@@ -1,79 +1,198 @@
+import argparse
+import json
+import time
+
 from dotenv import dotenv_values
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+import numpy as np
 import pandas as pd
-import datetime
 
-from enums import region_zone_dict, Region
+import db_schema
+import pipeline_utils
+import rollups
+from data_version import bump_data_version
+from db_schema import HISTORY_NATURAL_KEY
+from enums import region_zone_dict, quality_dict, Region
+from profiling import IngestionProfile, timed, timed_iter
 
 config = dotenv_values(".env")
 
-
-def handle_quality(row_value: str):
-    if row_value.find('1a'):
-        return 'Primera'
-    if row_value.find('2a'):
-        return 'Segunda'
-
-
-def begin(data_route, delimiter='|', batch_size=2000):
-    client = MongoClient(config["ADDRESS"], 27017)
-    db = client[config["DB_NAME"]]
-
-    data = pd.read_csv(data_route, delimiter=delimiter)
-    data = data.iloc[::-1]
-    print(data.head(10))
-    # data.fillna('Sin especificar')
-    print(data.info())
-    for col in data:
-        print(data[col].name)
-        print(data[col].unique())
-        print(len(data[col].unique()))
-
-    data_no_duplicates = data.drop_duplicates(subset='Producto', keep="first")
-    print(data_no_duplicates["Producto"])
-    for i, row in data_no_duplicates.iterrows():
-        db['foods'].insert_one({
-            'product_name': row['Producto'],
-            'group': row['Grupo']
-        })
-
-    curr_idx = 0
-    history_documents = []
-
-    for i, row in data.iterrows():
-        food_doc = db['foods'].find_one({'product_name': row['Producto']})
-
-        history_documents.append({
-            'date': datetime.datetime.strptime(str(row['Fecha']), '%d/%m/%Y %H:%M:%S'),
-            'year': row['Anio'],
-            'week': row['Semana'],
-            'region': row['Region'],
-            'zone': region_zone_dict[row['Region']],
-            'sector': row['Sector'],
-            'point_type': row['Tipo_de_punto'],
-            'variety': row['Variedad'],
-            'quality': handle_quality(row['Calidad']),
-            'unit': row['Unidad'],
-            'min_price': row['PrecioMinimo'],
-            'mean_price': float(str(row['PrecioPromedio']).replace(',', '.')),
-            'max_price': row['PrecioMaximo'],
-            'food_id': food_doc.get('_id')
-        })
-
-        curr_idx += 1
-
-        if curr_idx % batch_size == 0 and curr_idx != 0:
-            db['history'].insert_many(history_documents)
-            history_documents = []
-
-    # Insert remaining documents
-    if history_documents:
-        db['history'].insert_many(history_documents)
+DATE_FORMAT = '%d/%m/%Y %H:%M:%S'
+
+
+def handle_quality(column: pd.Series) -> pd.Series:
+    column = column.astype(str)
+    return pd.Series(np.select([column.str.contains('1a', regex=False),
+                                column.str.contains('2a', regex=False)],
+                               [quality_dict[1], quality_dict[2]],
+                               default=quality_dict[0]),
+                     index=column.index)
+
+
+def handle_price(column: pd.Series) -> pd.Series:
+    return pd.to_numeric(column.astype(str).str.replace(',', '.', regex=False))
+
+
+def load_food_ids(db) -> dict:
+    return {doc['product_name']: doc['_id']
+            for doc in db['foods'].find({}, {'product_name': 1})}
+
+
+def insert_missing_foods(db, data: pd.DataFrame, food_ids: dict):
+    new_foods = data.drop_duplicates(subset='Producto', keep='first')
+    new_foods = new_foods[~new_foods['Producto'].isin(food_ids)]
+    if new_foods.empty:
+        return
+    documents = [{'product_name': name, 'group': group}
+                 for name, group in zip(new_foods['Producto'], new_foods['Grupo'])]
+    db['foods'].insert_many(documents, ordered=False)
+    for doc in documents:
+        food_ids[doc['product_name']] = doc['_id']
+
+
+def build_history_frame(data: pd.DataFrame, profile: IngestionProfile | None = None) -> pd.DataFrame:
+    with timed(profile, 'parse_dates'):
+        dates = pd.to_datetime(data['Fecha'].astype(str), format=DATE_FORMAT)
+    with timed(profile, 'handle_quality'):
+        quality = handle_quality(data['Calidad'])
+    with timed(profile, 'handle_price'):
+        mean_price = handle_price(data['PrecioPromedio'])
+    return pd.DataFrame({
+        'date': dates,
+        'year': data['Anio'],
+        'week': data['Semana'],
+        'region': data['Region'],
+        'zone': data['Region'].map(region_zone_dict),
+        'sector': data['Sector'],
+        'point_type': data['Tipo_de_punto'],
+        'variety': data['Variedad'],
+        'quality': quality,
+        'unit': data['Unidad'],
+        'min_price': data['PrecioMinimo'],
+        'mean_price': mean_price,
+        'max_price': data['PrecioMaximo']
+    })
+
+
+def insert_history(db, documents: list, batch_size: int):
+    for start in range(0, len(documents), batch_size):
+        db['history'].insert_many(documents[start:start + batch_size], ordered=False)
+
+
+def upsert_history(db, documents: list, batch_size: int):
+    for start in range(0, len(documents), batch_size):
+        db['history'].bulk_write([
+            UpdateOne({key: doc[key] for key in HISTORY_NATURAL_KEY}, {'$set': doc}, upsert=True)
+            for doc in documents[start:start + batch_size]
+        ], ordered=False)
+
+
+def load_watermark(db):
+    return db['ingestion_state'].find_one({'_id': 'history'})
+
+
+def save_watermark(db, watermark: dict):
+    db['ingestion_state'].update_one({'_id': 'history'}, {'$set': watermark}, upsert=True)
+
+
+def read_chunks(data_route, delimiter='|', chunk_size=None):
+    if chunk_size is None:
+        yield pd.read_csv(data_route, delimiter=delimiter)
+        return
+    yield from pd.read_csv(data_route, delimiter=delimiter, chunksize=chunk_size)
+
+
+def ingest_chunk(db, data: pd.DataFrame, food_ids: dict, batch_size: int, watermark=None,
+                 profile: IngestionProfile | None = None) -> pd.DataFrame:
+    frame = build_history_frame(data, profile)
+    if watermark is not None:
+        newer = frame['date'] > watermark['date']
+        frame, data = frame[newer], data[newer]
+    with timed(profile, 'insert_foods'):
+        insert_missing_foods(db, data, food_ids)
+    frame = frame.assign(food_id=data['Producto'].map(food_ids),
+                         product_name=data['Producto'],
+                         group=data['Grupo'])
+
+    with timed(profile, 'build_documents'):
+        history_documents = [pipeline_utils.storage_document(doc) for doc in frame.to_dict('records')]
+    with timed(profile, 'write_history'):
+        if watermark is None or pipeline_utils.HISTORY_TIMESERIES:
+            insert_history(db, history_documents, batch_size)
+        else:
+            upsert_history(db, history_documents, batch_size)
+    return frame
+
+
+def begin(data_route, delimiter='|', batch_size=10000, chunk_size=None, incremental=False, profile_route=None,
+          db_name=None):
+    profile = IngestionProfile() if profile_route else None
+    client = MongoClient(config["ADDRESS"], 27017, event_listeners=[profile.listener] if profile else [])
+    db = client[db_name or config["DB_NAME"]]
+    start_time = time.perf_counter()
+
+    with timed(profile, 'bootstrap'):
+        db_schema.bootstrap(db)
+
+    watermark = None
+    latest = load_watermark(db)
+    if incremental:
+        watermark = latest or {'date': pd.Timestamp.min}
+
+    food_ids = load_food_ids(db)
+    total_rows = 0
+    touched_weeks, touched_months = set(), set()
+    for chunk in timed_iter(profile, 'read_csv', read_chunks(data_route, delimiter, chunk_size)):
+        frame = ingest_chunk(db, chunk, food_ids, batch_size, watermark, profile)
+        total_rows += len(frame)
+        weeks = frame[['year', 'week']].drop_duplicates()
+        touched_weeks.update((int(year), int(week)) for year, week in zip(weeks['year'], weeks['week']))
+        # Weekly rollups are dated by the first day of their week, up to six days before any row in it.
+        months = pd.concat([frame['date'], frame['date'] - pd.Timedelta(days=6)]).dt.to_period('M').unique()
+        touched_months.update((month.year, month.month) for month in months)
+        if not frame.empty and (latest is None or frame['date'].max() > latest['date']):
+            latest = frame.loc[frame['date'].idxmax(), ['year', 'week', 'date']].to_dict()
+        if chunk_size is not None:
+            elapsed = time.perf_counter() - start_time
+            print(f'{total_rows} rows ingested ({total_rows / elapsed:.0f} rows/sec)')
+
+    if touched_weeks:
+        with timed(profile, 'refresh_rollups'):
+            rollups.refresh_weekly_prices(db, touched_weeks)
+        with timed(profile, 'refresh_snapshots'):
+            rollups.refresh_seasonal_snapshots(db, touched_months)
+
+    elapsed = time.perf_counter() - start_time
+    print(f'Inserted {total_rows} rows in {elapsed:.2f}s '
+          f'({total_rows / elapsed:.0f} rows/sec)')
+    if latest is not None:
+        save_watermark(db, latest)
+    if total_rows:
+        bump_data_version(db)
+    client.close()
+
+    if profile is not None:
+        with open(profile_route, 'w') as profile_file:
+            json.dump(profile.report(total_rows, elapsed, batch_size, chunk_size), profile_file, indent=2)
 
 
 if __name__ == '__main__':
-    user_input = input("Insert route: ")
+    parser = argparse.ArgumentParser(description='Load an ODEPA price file into MongoDB.')
+    parser.add_argument('route', nargs='?')
+    parser.add_argument('--delimiter', default='|')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Stream the file in chunks of this many rows.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only load rows newer than the last ingested date and upsert them.')
+    parser.add_argument('--profile', default=None,
+                        help='Write per-phase timings, round trips and peak RSS as JSON to this path.')
+    parser.add_argument('--db-name', default=None)
+    args = parser.parse_args()
+
+    user_input = args.route or input("Insert route: ")
     if user_input.endswith((".csv", ".tsv")):
-        begin(user_input, delimiter='|')
+        begin(user_input, delimiter=args.delimiter, batch_size=args.batch_size, chunk_size=args.chunk_size,
+              incremental=args.incremental, profile_route=args.profile, db_name=args.db_name)
     else:
         print('error')
@@ -0,0 +1,54 @@
+import asyncio
+
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+DATA_VERSION_ID = 'data_version'
+
+
+def get_data_version(db) -> dict:
+    return db['meta'].find_one({'_id': DATA_VERSION_ID}) or {'_id': DATA_VERSION_ID, 'version': 0,
+                                                               'updated_at': None}
+
+
+def bump_data_version(db) -> dict:
+    return db['meta'].find_one_and_update({'_id': DATA_VERSION_ID},
+                                          {'$inc': {'version': 1}, '$currentDate': {'updated_at': True}},
+                                          upsert=True,
+                                          return_document=ReturnDocument.AFTER)
+
+
+class DataVersionTracker:
+    def __init__(self, db, poll_interval: float = 5.0):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.record = None
+        self._listeners = []
+
+    def on_change(self, listener):
+        self._listeners.append(listener)
+
+    def refresh(self) -> dict:
+        record = get_data_version(self.db)
+        if self.record is None or record['version'] != self.record['version']:
+            if self.record is not None:
+                for listener in self._listeners:
+                    try:
+                        listener(record)
+                    except Exception as error:
+                        print(f'WARNING: data version listener failed: {error!r}')
+            self.record = record
+        return self.record
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await run_in_threadpool(self.refresh)
+            except Exception as error:
+                print(f'WARNING: data version refresh failed: {error!r}')
+
+    def current(self) -> dict:
+        if self.record is None:
+            return self.refresh()
+        return self.record
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from itertools import islice
+
+from starlette.concurrency import run_in_threadpool
+
+from pipeline_utils import storage_pipeline
+
+
+def record_if_slow(request, collection: str, pipeline: list, started: float, returned: int):
+    recorder = getattr(request.app, 'slow_queries', None)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if recorder is None or not recorder.is_slow(duration_ms):
+        return
+    if recorder.should_explain():
+        asyncio.get_running_loop().run_in_executor(None, recorder.explain_and_record, request, collection, pipeline,
+                                                   duration_ms, returned)
+    else:
+        recorder.record(request, collection, pipeline, duration_ms, returned)
+
+
+async def aggregate(request, collection: str, pipeline: list) -> list:
+    pipeline = storage_pipeline(collection, pipeline)
+    started = time.perf_counter()
+    async_database = getattr(request.app, 'async_database', None)
+    if async_database is not None:
+        result = await async_database[collection].aggregate(pipeline).to_list(None)
+    else:
+        result = await run_in_threadpool(lambda: list(request.app.database[collection].aggregate(pipeline)))
+    record_if_slow(request, collection, pipeline, started, len(result))
+    return result
+
+
+async def find(request, collection: str, *args, **kwargs) -> list:
+    async_database = getattr(request.app, 'async_database', None)
+    if async_database is not None:
+        return await async_database[collection].find(*args, **kwargs).to_list(None)
+    return await run_in_threadpool(lambda: list(request.app.database[collection].find(*args, **kwargs)))
+
+
+async def aggregate_batches(request, collection: str, pipeline: list, batch_size: int = 1000):
+    pipeline = storage_pipeline(collection, pipeline)
+    async_database = getattr(request.app, 'async_database', None)
+    if async_database is not None:
+        cursor = async_database[collection].aggregate(pipeline, batchSize=batch_size)
+        while batch := await cursor.to_list(batch_size):
+            yield batch
+        return
+
+    cursor = await run_in_threadpool(lambda: request.app.database[collection].aggregate(pipeline,
+                                                                                          batchSize=batch_size))
+    try:
+        while batch := await run_in_threadpool(lambda: list(islice(cursor, batch_size))):
+            yield batch
+    finally:
+        cursor.close()
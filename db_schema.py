@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+import pipeline_utils
+from rollups import WEEKLY_PRICES_KEY
+
+HISTORY_NATURAL_KEY = ('date', 'region', 'sector', 'point_type', 'variety', 'quality', 'unit', 'food_id')
+
+INDEXES = {
+    'history': [
+        ('history_year_week_filters', ['year', 'week', 'region', 'point_type', 'quality', 'unit']),
+        ('history_product_year_week', ['product_name', 'year', 'week']),
+        ('history_date_filters', ['date', 'region', 'point_type', 'quality', 'unit']),
+        ('history_food_date', ['food_id', 'date']),
+        ('history_natural_key', list(HISTORY_NATURAL_KEY)),
+    ],
+    'weekly_prices': [
+        ('weekly_prices_series_week', WEEKLY_PRICES_KEY, {'unique': True}),
+        ('weekly_prices_year_week_filters', ['year', 'week', 'region', 'point_type', 'quality', 'unit']),
+        ('weekly_prices_date', ['date']),
+        ('weekly_prices_product_date', ['product_name', 'date']),
+    ],
+    'seasonal_snapshot': [
+        ('seasonal_snapshot_region_month', ['region', 'year', 'month'], {'unique': True}),
+    ],
+    'foods': [
+        ('foods_product_name', ['product_name']),
+    ],
+    'harvest': [
+        ('harvest_ingredient_zone', ['ingredient_id', 'zone']),
+        ('harvest_zone_months', ['zone', 'harvest_months']),
+    ],
+}
+
+
+RETIRED_INDEXES = {
+    'history': ['history_food_year_week'],
+}
+
+
+def history_options(db) -> dict | None:
+    collection = next(iter(db.list_collections(filter={'name': 'history'})), None)
+    return None if collection is None else collection.get('options', {})
+
+
+def ensure_history_collection(db):
+    options = history_options(db)
+    if options is None:
+        if pipeline_utils.HISTORY_TIMESERIES:
+            db.create_collection('history', timeseries={'timeField': 'date', 'metaField': 'meta',
+                                                        'granularity': 'hours'})
+        return
+    if pipeline_utils.HISTORY_TIMESERIES and 'timeseries' not in options:
+        raise RuntimeError('HISTORY_TIMESERIES is enabled but history is a plain collection; '
+                           'run `python migrations.py --timeseries` first')
+    if not pipeline_utils.HISTORY_TIMESERIES and 'timeseries' in options:
+        raise RuntimeError('history is a time-series collection; set HISTORY_TIMESERIES = true')
+
+
+def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        for name, keys, *options in indexes:
+            if collection == 'history':
+                keys = list(pipeline_utils.storage_match(dict.fromkeys(keys)))
+            db[collection].create_index([(key, ASCENDING) for key in keys], name=name,
+                                        **(options[0] if options else {}))
+
+
+def drop_retired_indexes(db):
+    for collection, names in RETIRED_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+
+
+def _uses_index(plan) -> bool:
+    plan = str(plan)
+    return 'IXSCAN' in plan and 'COLLSCAN' not in plan
+
+
+def explain_query_shapes(db) -> dict:
+    year = datetime.now().year
+    history_filter = pipeline_utils.HistoryFilter(year=year, week_from=1, week_to=53, region_id=1, store_id=3,
+                                                  quality_val=1, unit_id=1)
+    history_pipeline = pipeline_utils.storage_pipeline('history', [{'$match': history_filter.to_match()}])
+    return {
+        'history.filters': db.command('explain', {'aggregate': 'history', 'pipeline': history_pipeline,
+                                                  'cursor': {}}, verbosity='queryPlanner'),
+        'history.date_filters': db['history'].find(pipeline_utils.storage_match({
+            'date': {'$gte': datetime(year - 1, 12, 1), '$lte': datetime(year, 1, 31)},
+            'region': ''
+        })).explain(),
+        'history.food_date': db['history'].find(pipeline_utils.storage_match({
+            'food_id': None,
+            'date': {'$gte': pipeline_utils.recent_weeks_start()}
+        })).explain(),
+        'weekly_prices.filters': db.command('explain', {'aggregate': 'weekly_prices',
+                                                        'pipeline': [{'$match': history_filter.to_match()}],
+                                                        'cursor': {}}, verbosity='queryPlanner'),
+        'weekly_prices.product_date': db['weekly_prices'].find({
+            'product_name': '',
+            'date': {'$gte': pipeline_utils.recent_weeks_start()}
+        }).explain(),
+        'seasonal_snapshot.region_month': db['seasonal_snapshot'].find({'region': '', 'year': year,
+                                                                        'month': 1}).explain(),
+        'foods.product_name': db['foods'].find({'product_name': ''}).explain(),
+        'harvest.ingredient_zone': db['harvest'].find({'ingredient_id': '', 'zone': ''}).explain(),
+    }
+
+
+def verify_indexes(db) -> dict:
+    results = {shape: _uses_index(plan) for shape, plan in explain_query_shapes(db).items()}
+    for shape, uses_index in results.items():
+        if not uses_index:
+            print(f'WARNING: query shape {shape} is not served by an index')
+    return results
+
+
+def bootstrap(db, verify=False):
+    ensure_history_collection(db)
+    drop_retired_indexes(db)
+    ensure_indexes(db)
+    if verify:
+        return verify_indexes(db)
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from enum import Enum
+
+from fastapi import APIRouter, Depends, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import Annotated
+
+import database
+import pipeline_utils
+from routes import date_bounds, resolve_product
+
+router = APIRouter()
+
+
+class ExportDataset(Enum):
+    HISTORY = "history"
+    WEEKLY_PRICES = "weekly_prices"
+
+
+class ExportFormat(Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+EXPORT_COLUMNS = {
+    ExportDataset.HISTORY: ['date', 'year', 'week', 'product_name', 'group', 'region', 'zone', 'sector',
+                            'point_type', 'variety', 'quality', 'unit', 'min_price', 'mean_price', 'max_price'],
+    ExportDataset.WEEKLY_PRICES: ['date', 'year', 'week', 'product_name', 'group', 'region', 'point_type',
+                                  'quality', 'unit', 'min_price', 'mean_price', 'max_price', 'count'],
+}
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv',
+}
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(batch: list, columns: list) -> str:
+    return ''.join(json.dumps(doc, default=_default, ensure_ascii=False) + '\n' for doc in batch)
+
+
+def encode_csv(batch: list, columns: list) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writerows(batch)
+    return buffer.getvalue()
+
+
+async def stream_export(request: Request, dataset: ExportDataset, pipeline: list, export_format: ExportFormat,
+                        gzip: bool):
+    columns = EXPORT_COLUMNS[dataset]
+    encode = encode_ndjson if export_format is ExportFormat.NDJSON else encode_csv
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if gzip else None
+
+    def emit(text: str) -> bytes:
+        payload = text.encode('utf-8')
+        return compressor.compress(payload) if compressor else payload
+
+    if export_format is ExportFormat.CSV:
+        yield emit(','.join(columns) + '\r\n')
+    async for batch in database.aggregate_batches(request, dataset.value, pipeline):
+        yield emit(encode(batch, columns))
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/export/{dataset}/year/{year_val}/",
+            response_description="Streams price history rows as NDJSON or CSV.")
+async def export_history(request: Request,
+                         dataset: ExportDataset,
+                         year_val: int,
+                         product_name: Annotated[str | None, Query(alias='product')] = None,
+                         region_id: Annotated[int | None, Query(alias='region')] = None,
+                         group_id: Annotated[int | None, Query(alias='category')] = None,
+                         week_from: Annotated[int | None, Query(alias="week_gte")] = 1,
+                         week_to: Annotated[int | None, Query(alias="week_lte")] = 53,
+                         quality_val: Annotated[int | None, Query(alias="quality")] = None,
+                         store_type_id: Annotated[int | None, Query(alias="store")] = None,
+                         unit_id: Annotated[int | None, Query(alias='unit_metric')] = None,
+                         export_format: Annotated[ExportFormat, Query(alias='format')] = ExportFormat.NDJSON,
+                         gzip: bool = False,
+                         dates: Annotated[tuple, Depends(date_bounds)] = (None, None)):
+    spec = pipeline_utils.HistoryFilter(year=year_val,
+                                        region_id=region_id,
+                                        quality_val=quality_val,
+                                        store_id=store_type_id,
+                                        week_from=week_from,
+                                        week_to=week_to,
+                                        unit_id=unit_id,
+                                        group_id=group_id,
+                                        date_from=dates[0],
+                                        date_to=dates[1])
+    if product_name is not None:
+        spec.product_name = resolve_product(request, product_name)['product_name']
+    pipeline = [
+        {'$match': spec.to_match()},
+        {'$project': {'_id': 0, **{column: 1 for column in EXPORT_COLUMNS[dataset]}}}
+    ]
+
+    headers = {'Content-Disposition': f'attachment; filename="{dataset.value}_{year_val}.{export_format.value}"'}
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(stream_export(request, dataset, pipeline, export_format, gzip),
+                             media_type=MEDIA_TYPES[export_format],
+                             headers=headers)
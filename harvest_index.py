@@ -0,0 +1,26 @@
+from collections import defaultdict
+
+
+class HarvestIndex:
+    def __init__(self, documents=()):
+        self.masks = defaultdict(int)
+        for doc in documents:
+            for month in doc['harvest_months']:
+                self.masks[(doc['zone'], doc['ingredient_id'])] |= 1 << (month - 1)
+
+        self.products = defaultdict(set)
+        for (zone, product), mask in self.masks.items():
+            for month in range(1, 13):
+                if mask & (1 << (month - 1)):
+                    self.products[(zone, month)].add(product)
+        self.products = {key: sorted(products) for key, products in self.products.items()}
+
+    @classmethod
+    def load(cls, db):
+        return cls(db['harvest'].find({}, {'_id': 0, 'ingredient_id': 1, 'zone': 1, 'harvest_months': 1}))
+
+    def is_in_season(self, product: str, zone: str, month: int) -> bool:
+        return bool(self.masks.get((zone, product), 0) & (1 << (month - 1)))
+
+    def products_in_season(self, zone: str, month: int) -> list:
+        return self.products.get((zone, month), [])
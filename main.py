@@ -1,11 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from dotenv import dotenv_values
 from pymongo import MongoClient
 from routes import router as food_router
+from export_routes import router as export_router
+from admin_routes import router as admin_router
+import cache
+import conditional
+import db_schema
+import metrics
+import slow_queries
+from catalog import ProductCatalog
+from data_version import DataVersionTracker
+from harvest_index import HarvestIndex
+from price_cube import PriceCube
 
 config = dotenv_values(".env")
 
-app = FastAPI()
+
+def startup_db_client(app: FastAPI):
+    app.mongodb_client = MongoClient(config["ADDRESS"], 27017, event_listeners=metrics.event_listeners())
+    app.database = app.mongodb_client[config["DB_NAME"]]
+    db_schema.bootstrap(app.database, verify=config.get("VERIFY_INDEXES", "false").lower() == "true")
+
+    app.data_version = DataVersionTracker(app.database, float(config.get("DATA_VERSION_POLL_INTERVAL", 5)))
+    app.response_cache = cache.create_cache(config)
+    app.slow_queries = slow_queries.create_recorder(config)
+    if app.response_cache is not None:
+        app.data_version.on_change(lambda record: app.response_cache.clear())
+    app.harvest_index = HarvestIndex.load(app.database)
+    app.data_version.on_change(lambda record: setattr(app, 'harvest_index', HarvestIndex.load(app.database)))
+    app.catalog = ProductCatalog.load(app.database)
+    app.data_version.on_change(lambda record: setattr(app, 'catalog', ProductCatalog.load(app.database)))
+
+    app.price_cube = None
+    if config.get("SERVING_ENGINE", "mongo").lower() == "cube":
+        cube_years = int(config.get("PRICE_CUBE_YEARS", 3))
+        app.price_cube = PriceCube.load(app.database, cube_years)
+        app.data_version.on_change(lambda record: setattr(app, 'price_cube', PriceCube.load(app.database,
+                                                                                            cube_years)))
+    app.data_version.refresh()
+
+    app.async_mongodb_client = None
+    app.async_database = None
+    if config.get("ASYNC_DRIVER", "false").lower() == "true":
+        from motor.motor_asyncio import AsyncIOMotorClient
+        app.async_mongodb_client = AsyncIOMotorClient(config["ADDRESS"], 27017,
+                                                        event_listeners=metrics.event_listeners())
+        app.async_database = app.async_mongodb_client[config["DB_NAME"]]
+
+
+def shutdown_db_client(app: FastAPI):
+    if app.async_mongodb_client is not None:
+        app.async_mongodb_client.close()
+    app.mongodb_client.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_db_client(app)
+    poller = asyncio.create_task(app.data_version.poll())
+    yield
+    poller.cancel()
+    shutdown_db_client(app)
+
+
+API_PREFIX = "/seasonal-foods/api/v1"
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(conditional.ConditionalGetMiddleware, prefixes=[API_PREFIX], exclude=[f"{API_PREFIX}/admin"])
+app.add_middleware(metrics.PrometheusMiddleware)
 
 
 @app.get("/")
@@ -13,20 +79,14 @@ async def root():
     return {"message": "Hello World"}
 
 
+app.add_api_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
+
+
 @app.get("/hello/{name}")
 async def say_hello(name: str):
     return {"message": f"Hello {name}"}
 
 
-@app.on_event("startup")
-def startup_db_client():
-    app.mongodb_client = MongoClient(config["ADDRESS"], 27017)
-    app.database = app.mongodb_client[config["DB_NAME"]]
-
-
-@app.on_event("shutdown")
-def shutdown_db_client():
-    app.mongodb_client.close()
-
-
-app.include_router(food_router, tags=["seasonal-foods"], prefix="/seasonal-foods/api/v1")
+app.include_router(food_router, tags=["seasonal-foods"], prefix=API_PREFIX)
+app.include_router(export_router, tags=["seasonal-foods-export"], prefix=API_PREFIX)
+app.include_router(admin_router, tags=["seasonal-foods-admin"], prefix=API_PREFIX)
@@ -0,0 +1,142 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.routing import Match
+
+current_route = ContextVar('current_route', default='unmatched')
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests handled.', ['route', 'method', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency.', ['route', 'method'])
+IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being handled.', ['route', 'method'])
+
+MONGO_COMMAND_LATENCY = Histogram('mongo_command_duration_seconds', 'MongoDB command latency by route.',
+                                  ['route', 'command', 'collection'])
+MONGO_DOCUMENTS_RETURNED = Counter('mongo_documents_returned_total', 'Documents returned by MongoDB cursors.',
+                                   ['route', 'command', 'collection'])
+MONGO_COMMAND_FAILURES = Counter('mongo_command_failures_total', 'MongoDB commands that failed.',
+                                 ['route', 'command'])
+MONGO_POOL_CHECKOUT_WAIT = Histogram('mongo_pool_checkout_wait_seconds',
+                                     'Time spent waiting for a connection from the pool.',
+                                     buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+MONGO_POOL_CHECKOUT_FAILURES = Counter('mongo_pool_checkout_failures_total', 'Pool checkouts that failed.',
+                                       ['reason'])
+
+
+def _reply_documents(reply: dict) -> int:
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    return 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        self._pending[event.request_id] = (current_route.get(), collection if isinstance(collection, str) else '')
+
+    def succeeded(self, event):
+        route, collection = self._pending.pop(event.request_id, (current_route.get(), ''))
+        labels = (route, event.command_name, collection)
+        MONGO_COMMAND_LATENCY.labels(*labels).observe(event.duration_micros / 1e6)
+        documents = _reply_documents(event.reply)
+        if documents:
+            MONGO_DOCUMENTS_RETURNED.labels(*labels).inc(documents)
+
+    def failed(self, event):
+        route, _ = self._pending.pop(event.request_id, (current_route.get(), ''))
+        MONGO_COMMAND_FAILURES.labels(route, event.command_name).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._checkout = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._checkout.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._checkout, 'started', None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._checkout.started = None
+
+    def connection_check_out_failed(self, event):
+        self._checkout.started = None
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+def event_listeners() -> list:
+    return [CommandMetrics(), PoolMetrics()]
+
+
+def route_template(app, scope) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+
+class PrometheusMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        route, method = route_template(scope['app'], scope), scope['method']
+        token = current_route.set(route)
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        IN_FLIGHT.labels(route, method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(route, method).observe(time.perf_counter() - start)
+            REQUESTS.labels(route, method, str(status[0])).inc()
+            IN_FLIGHT.labels(route, method).dec()
+            current_route.reset(token)
+
+
+async def metrics_endpoint():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
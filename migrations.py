@@ -0,0 +1,71 @@
+import argparse
+
+from bson import json_util
+from dotenv import dotenv_values
+from pymongo import MongoClient
+
+import db_schema
+import pipeline_utils
+import rollups
+from data_version import bump_data_version
+
+config = dotenv_values(".env")
+
+
+def backfill_history_food_fields(db) -> int:
+    updated = 0
+    for food in db['foods'].find({}, {'product_name': 1, 'group': 1}):
+        result = db['history'].update_many(
+            {'food_id': food['_id'], 'product_name': {'$exists': False}},
+            {'$set': {'product_name': food['product_name'], 'group': food['group']}})
+        updated += result.modified_count
+    return updated
+
+
+def load_harvest_calendar(db, route: str) -> int:
+    with open(route, encoding='utf-8') as harvest_file:
+        documents = json_util.loads(harvest_file.read())
+    db['harvest'].delete_many({})
+    db['harvest'].insert_many(documents)
+    return len(documents)
+
+
+def convert_history_to_timeseries(db, batch_size: int = 10000) -> int:
+    if not pipeline_utils.HISTORY_TIMESERIES:
+        raise RuntimeError('Set HISTORY_TIMESERIES = true before converting history to a time-series collection')
+    if 'timeseries' in (db_schema.history_options(db) or {}):
+        raise RuntimeError('history is already a time-series collection')
+    db['history'].rename('history_legacy')
+    db_schema.bootstrap(db)
+    converted, batch = 0, []
+    for document in db['history_legacy'].find({}, {'_id': 0}):
+        batch.append(pipeline_utils.storage_document(document))
+        if len(batch) == batch_size:
+            db['history'].insert_many(batch, ordered=False)
+            converted, batch = converted + len(batch), []
+    if batch:
+        db['history'].insert_many(batch, ordered=False)
+        converted += len(batch)
+    return converted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='One-shot data migrations.')
+    parser.add_argument('--harvest', help='Replace the harvest calendar with this JSON export.')
+    parser.add_argument('--timeseries', action='store_true',
+                        help='Copy history into a time-series collection (requires HISTORY_TIMESERIES=true).')
+    args = parser.parse_args()
+
+    client = MongoClient(config["ADDRESS"], 27017)
+    db = client[config["DB_NAME"]]
+    if args.harvest:
+        print(f'Loaded {load_harvest_calendar(db, args.harvest)} harvest documents')
+        rollups.refresh_seasonal_snapshots(db)
+    elif args.timeseries:
+        print(f'Copied {convert_history_to_timeseries(db)} documents into the history time-series collection')
+    else:
+        print(f'Backfilled {backfill_history_food_fields(db)} history documents')
+        rollups.refresh_weekly_prices(db)
+        rollups.refresh_seasonal_snapshots(db)
+    bump_data_version(db)
+    client.close()
@@ -17,6 +17,11 @@ class Food(BaseModel):
     price: float
 
 
+class CatalogFood(BaseModel):
+    name: str
+    category: str
+
+
 class HarvestFoods(BaseModel):
     foods: List[str]
 
@@ -67,3 +72,13 @@ class FoodPricesInRegion(BaseModel):
     quality: str
     unit: str
     history: List[FoodDateAndPrice]
+
+
+class BasketHistoryRequest(BaseModel):
+    products: List[str] = Field(min_length=1, max_length=100)
+    region: Optional[int] = None
+    quality: Optional[int] = None
+    store: Optional[int] = None
+    unit_metric: Optional[int] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
@@ -0,0 +1,42 @@
+import base64
+from functools import wraps
+
+from bson import json_util
+from bson.errors import InvalidBSON
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_PAGE_HEADER = 'X-Next-Page-Token'
+
+
+def encode_page_token(values: dict) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token: str | None, keys: list) -> dict | None:
+    if token is None:
+        return None
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, InvalidBSON):
+        values = None
+    if (not isinstance(values, dict) or any(key not in values for key in keys)
+            or any(isinstance(values[key], (dict, list)) for key in keys)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid page token')
+    return values
+
+
+def paginated(sort_keys: list):
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            items = await endpoint(*args, **kwargs)
+            if len(items) == kwargs['limit']:
+                kwargs['response'].headers[NEXT_PAGE_HEADER] = encode_page_token(
+                    {key: items[-1].get(key) for key in sort_keys})
+            return items
+
+        return wrapper
+
+    return decorator
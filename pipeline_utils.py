@@ -1,56 +1,210 @@
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from dotenv import dotenv_values
+
 import enums
 
+config = dotenv_values(".env")
 
-def generate_history_pipeline(region_id, store_id, quality_val, year_val, unit_id, week_from, week_to):
-    week_num = datetime.today().isocalendar()[1]
-    pipeline = [{
-                    '$match': {
-                        'week': {
-                            '$gte': week_num - 4
-                        },
-                        'year': year_val
-                    }
-                } if week_from is None and week_to is None else {
-        '$match': {
-            'week': {
-                '$gte': week_from,
-                '$lte': week_to
-            },
-            'year': year_val
-        }
-    }]
-    if region_id is not None:
-        pipeline.append(
-            {
-                '$match': {
-                    'region': enums.region_dict[region_id].value,
-                }
-            })
+HISTORY_TIMESERIES = config.get("HISTORY_TIMESERIES", "false").lower() == "true"
+HISTORY_META_FIELDS = ('region', 'zone', 'sector', 'point_type', 'variety', 'quality', 'unit', 'food_id',
+                       'product_name', 'group')
+SHAPE_CHANGING_STAGES = ('$group', '$project', '$replaceRoot')
 
-    if store_id is not None:
-        pipeline.append(
-            {
-                '$match': {
-                    'point_type': enums.point_dict[store_id].value,
-                }
-            })
 
-    if quality_val is not None:
-        pipeline.append(
-            {
-                '$match': {
-                    'quality': enums.quality_dict[quality_val]
-                }
-            })
+@dataclass
+class HistoryFilter:
+    year: int | None = None
+    week_from: int | None = None
+    week_to: int | None = None
+    date_from: datetime | None = None
+    date_to: datetime | None = None
+    region_id: int | None = None
+    store_id: int | None = None
+    quality_val: int | None = None
+    unit_id: int | None = None
+    group_id: int | None = None
+    product_name: str | None = None
+    product_names: list[str] | None = None
+    product_name_from: str | None = None
+    food_id: object | None = None
+    recent_weeks: int = 4
+
+    def to_match(self) -> dict:
+        match = {}
+        if self.year is not None:
+            match['year'] = self.year
+
+        week = {}
+        if self.week_from is not None:
+            week['$gte'] = self.week_from
+        if self.week_to is not None:
+            week['$lte'] = self.week_to
+        if not week and self.year is not None and self.date_from is None and self.date_to is None:
+            week['$gte'] = datetime.today().isocalendar()[1] - self.recent_weeks
+        if week:
+            match['week'] = week
+
+        if self.region_id is not None:
+            match['region'] = enums.region_dict[self.region_id].value
+        if self.store_id is not None:
+            match['point_type'] = enums.point_dict[self.store_id].value
+        if self.quality_val is not None:
+            match['quality'] = enums.quality_dict[self.quality_val]
+        if self.unit_id is not None:
+            match['unit'] = enums.unit_metric_dict[self.unit_id]
+
+        if self.product_name is not None:
+            match['product_name'] = self.product_name
+        elif self.product_names is not None:
+            match['product_name'] = {'$in': self.product_names}
+        if self.product_name is None and self.product_name_from is not None:
+            match['product_name'] = {**match.get('product_name', {}), '$gte': self.product_name_from}
+        if self.food_id is not None:
+            match['food_id'] = self.food_id
+        if self.group_id is not None:
+            match['group'] = enums.category_dict[self.group_id].value
+
+        date = {}
+        if self.date_from is not None:
+            date['$gte'] = self.date_from
+        if self.date_to is not None:
+            date['$lte'] = self.date_to
+        if date:
+            match['date'] = date
+        return match
+
+
+def recent_weeks_start(weeks: int = 4) -> datetime:
+    today = date.today()
+    return datetime.combine(today - timedelta(days=today.weekday(), weeks=weeks), time.min)
+
+
+def parse_date_bound(value: str, end: bool = False) -> datetime:
+    if 'W' in value.upper():
+        year, week = value.upper().split('-W')
+        day = date.fromisocalendar(int(year), int(week), 7 if end else 1)
+    else:
+        day = date.fromisoformat(value)
+    return datetime.combine(day, time.max if end else time.min)
+
+
+def _resolve(expression, keys):
+    if isinstance(expression, str) and expression.startswith('$') and expression[1:].split('.')[0] in keys:
+        return '$_id.' + expression[1:]
+    if isinstance(expression, dict):
+        return {name: _resolve(value, keys) for name, value in expression.items()}
+    if isinstance(expression, list):
+        return [_resolve(value, keys) for value in expression]
+    return expression
 
-    if unit_id is not None:
-        pipeline.append(
-            {
-                '$match': {
-                    'unit':  enums.unit_metric_dict[unit_id]
-                }
-            })
 
+def _sort_stage(sort: dict, keys: dict) -> dict:
+    return {'$sort': {f'_id.{name}': direction for name, direction in sort.items() if name in keys}}
 
+
+def keyset_predicate(sort: dict, after: dict) -> dict:
+    branches = []
+    names = list(sort)
+    for position, name in enumerate(names):
+        branch = {previous: after[previous] for previous in names[:position]}
+        branch[name] = {'$gt' if sort[name] > 0 else '$lt': after[name]}
+        branches.append(branch)
+    return {'$or': branches}
+
+
+def compile_pipeline(spec: HistoryFilter, keys: dict, accumulators: dict, project: dict | None = None,
+                     sort: dict | None = None, after: dict | None = None, limit: int | None = None) -> list:
+    if project is None:
+        project = {name: f'${name}' for name in [*keys, *accumulators]}
+    match = spec.to_match()
+    if after:
+        fields = {name: keys[name][1:] for name in sort}
+        match.update(keyset_predicate({fields[name]: direction for name, direction in sort.items()},
+                                      {fields[name]: after[name] for name in sort}))
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': keys, **accumulators}}
+    ]
+    if sort:
+        pipeline.append(_sort_stage(sort, keys))
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline.append({'$project': {'_id': 0, **_resolve(project, keys)}})
     return pipeline
+
+
+def compile_series_pipeline(spec: HistoryFilter, series_keys: dict, point_keys: dict, accumulators: dict,
+                            series_field: str = 'history', sort: dict | None = None) -> list:
+    pipeline = [
+        {'$match': spec.to_match()},
+        {'$group': {'_id': {**series_keys, **point_keys}, **accumulators}}
+    ]
+    if sort:
+        pipeline.append(_sort_stage(sort, point_keys))
+    pipeline.extend([
+        {'$group': {
+            '_id': {name: f'$_id.{name}' for name in series_keys},
+            series_field: {
+                '$push': {
+                    **{name: f'$_id.{name}' for name in point_keys},
+                    **{name: f'${name}' for name in accumulators}
+                }
+            }
+        }},
+        {'$project': {'_id': 0, **_resolve({name: f'${name}' for name in series_keys}, series_keys),
+                      series_field: f'${series_field}'}}
+    ])
+    return pipeline
+
+
+def _storage_path(path: str) -> str:
+    if path.split('.')[0] in HISTORY_META_FIELDS:
+        return f'meta.{path}'
+    return path
+
+
+def _storage_expression(expression):
+    if isinstance(expression, str) and expression.startswith('$') and not expression.startswith('$$'):
+        return '$' + _storage_path(expression[1:])
+    if isinstance(expression, dict):
+        return {name: _storage_expression(value) for name, value in expression.items()}
+    if isinstance(expression, list):
+        return [_storage_expression(value) for value in expression]
+    return expression
+
+
+def storage_match(match: dict) -> dict:
+    if not HISTORY_TIMESERIES:
+        return match
+    return {name if name.startswith('$') else _storage_path(name):
+            [storage_match(branch) for branch in value] if name in ('$or', '$and') else value
+            for name, value in match.items()}
+
+
+def storage_document(document: dict) -> dict:
+    if not HISTORY_TIMESERIES:
+        return document
+    meta = {name: document[name] for name in HISTORY_META_FIELDS if name in document}
+    return {**{name: value for name, value in document.items() if name not in meta}, 'meta': meta}
+
+
+def storage_pipeline(collection: str, pipeline: list) -> list:
+    if collection != 'history' or not HISTORY_TIMESERIES:
+        return pipeline
+    compiled = []
+    for position, stage in enumerate(pipeline):
+        (operator, body), = stage.items()
+        if operator == '$match':
+            compiled.append({operator: storage_match(body)})
+        elif operator == '$sort':
+            compiled.append({operator: {_storage_path(name): direction for name, direction in body.items()}})
+        elif operator == '$project':
+            compiled.append({operator: {name: f'$meta.{name}' if value == 1 and name in HISTORY_META_FIELDS
+                                        else _storage_expression(value) for name, value in body.items()}})
+        else:
+            compiled.append({operator: _storage_expression(body)})
+        if operator in SHAPE_CHANGING_STAGES:
+            return compiled + pipeline[position + 1:]
+    return compiled
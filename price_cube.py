@@ -0,0 +1,225 @@
+from datetime import date, datetime, time
+
+import numpy as np
+
+import enums
+
+AXES = ('product_name', 'region', 'point_type', 'quality', 'unit')
+AFTER_KEYS = ('name', 'region', 'point_type', 'quality', 'unit')
+WEEKS = 53
+NO_DATE = np.datetime64('9999-12-31', 'ms')
+SEARCH_CHUNK = 256
+
+ENUM_LABELS = {
+    'product_name': set(),
+    'region': {region.value for region in enums.region_dict.values()},
+    'point_type': {point.value for point in enums.point_dict.values()},
+    'quality': set(enums.quality_dict.values()),
+    'unit': set(enums.unit_metric_dict.values()),
+}
+
+
+class PriceCube:
+    def __init__(self, documents, years: list):
+        self.year_labels = list(years)
+        self.years = {year: position for position, year in enumerate(years)}
+        documents = [doc for doc in documents if all(doc.get(axis) is not None for axis in AXES)
+                     and doc['year'] in self.years and 1 <= doc['week'] <= WEEKS]
+        self.labels = {axis: sorted(ENUM_LABELS[axis] | {doc[axis] for doc in documents}) for axis in AXES}
+        self.positions = {axis: {label: position for position, label in enumerate(labels)}
+                          for axis, labels in self.labels.items()}
+        self.groups = {doc['product_name']: doc.get('group') for doc in documents}
+        self.dims = tuple(len(self.labels[axis]) for axis in AXES)
+
+        # One row per existing (product, region, point, quality, unit) series, ordered by its labels so the
+        # row order is also the keyset order of the search endpoint.
+        coordinates = np.array([[self.positions[axis][doc[axis]] for axis in AXES] for doc in documents],
+                               dtype=np.int64).reshape(-1, len(AXES))
+        codes = np.ravel_multi_index(coordinates.T, self.dims) if documents else np.zeros(0, dtype=np.int64)
+        self.codes, rows = np.unique(codes, return_inverse=True)
+        self.coordinates = np.array(np.unravel_index(self.codes, self.dims), dtype=np.int64).reshape(len(AXES), -1)
+
+        shape = (len(self.codes), len(years), WEEKS)
+        self.price_sum = np.zeros(shape, dtype=np.float64)
+        self.count = np.zeros(shape, dtype=np.int32)
+        self.min_price = np.full(shape, np.inf, dtype=np.float64)
+        self.max_price = np.full(shape, -np.inf, dtype=np.float64)
+        self.dates = np.full((len(years), WEEKS), NO_DATE, dtype='datetime64[ms]')
+        if not documents:
+            return
+
+        index = (rows.reshape(-1),
+                 np.array([self.years[doc['year']] for doc in documents]),
+                 np.array([doc['week'] - 1 for doc in documents]))
+        self.price_sum[index] = [doc['price_sum'] for doc in documents]
+        self.count[index] = [doc['count'] for doc in documents]
+        self.min_price[index] = [doc['min_price'] for doc in documents]
+        self.max_price[index] = [doc['max_price'] for doc in documents]
+        dates = np.array([doc['date'] for doc in documents], dtype='datetime64[ms]')
+        np.minimum.at(self.dates, index[1:], dates)
+
+    def _date(self, year_position, week_position):
+        date = self.dates[year_position, week_position]
+        return None if date == NO_DATE else date.astype(object)
+
+    @classmethod
+    def load(cls, db, years: int = 3):
+        latest = db['weekly_prices'].find_one({}, {'year': 1}, sort=[('year', -1)])
+        if latest is None:
+            return cls([], [])
+        loaded_years = list(range(latest['year'] - years + 1, latest['year'] + 1))
+        projection = {'_id': 0, 'group': 1, 'date': 1, 'year': 1, 'week': 1, 'price_sum': 1, 'count': 1,
+                      'min_price': 1, 'max_price': 1, **{axis: 1 for axis in AXES}}
+        return cls(db['weekly_prices'].find({'year': {'$gte': loaded_years[0]}}, projection), loaded_years)
+
+    def covers(self, match: dict) -> bool:
+        if not self.year_labels:
+            return False
+        if 'year' in match:
+            return match['year'] in self.years
+        if 'date' in match:
+            first_day = datetime.combine(date.fromisocalendar(self.year_labels[0], 1, 1), time.min)
+            return '$gte' in match['date'] and match['date']['$gte'] >= first_day
+        return False
+
+    def _axis(self, axis: str, condition) -> np.ndarray:
+        labels, positions = self.labels[axis], self.positions[axis]
+        if not isinstance(condition, dict):
+            return np.array([positions[condition]] if condition in positions else [], dtype=np.int64)
+        candidates = condition['$in'] if '$in' in condition else labels
+        if '$gte' in condition:
+            candidates = [label for label in candidates if label >= condition['$gte']]
+        return np.array(sorted(positions[label] for label in candidates if label in positions), dtype=np.int64)
+
+    def _rows(self, match: dict) -> np.ndarray:
+        keep = np.ones(len(self.codes), dtype=bool)
+        for axis, coordinates in zip(AXES, self.coordinates):
+            if match.get(axis) is not None:
+                keep &= np.isin(coordinates, self._axis(axis, match[axis]))
+        if 'group' in match:
+            names = self.labels['product_name']
+            products = [p for p, name in enumerate(names) if self.groups.get(name) == match['group']]
+            keep &= np.isin(self.coordinates[0], products)
+        return np.flatnonzero(keep)
+
+    def _after(self, rows: np.ndarray, after: dict) -> np.ndarray:
+        greater, equal = np.zeros(len(rows), dtype=bool), np.ones(len(rows), dtype=bool)
+        for axis, key, coordinates in zip(AXES, AFTER_KEYS, self.coordinates):
+            coordinates = coordinates[rows]
+            position = self.positions[axis].get(after[key])
+            if position is None:
+                # Unknown labels sort between existing ones, so no row ties with them.
+                greater |= equal & (coordinates >= np.searchsorted(self.labels[axis], after[key]))
+                break
+            greater |= equal & (coordinates > position)
+            equal &= coordinates == position
+        return rows[greater]
+
+    def _cells(self, match: dict):
+        if 'year' in match:
+            year = self.years.get(match['year'])
+            years = np.array([] if year is None else [year], dtype=np.int64)
+        else:
+            years = np.arange(len(self.year_labels), dtype=np.int64)
+        weeks = match.get('week', {})
+        week_from, week_to = max(weeks.get('$gte', 1), 1), min(weeks.get('$lte', WEEKS), WEEKS)
+        weeks = np.arange(week_from - 1, max(week_to, week_from - 1), dtype=np.int64)
+        if 'date' not in match:
+            return years, weeks, None
+
+        dates = self.dates[np.ix_(years, weeks)]
+        keep = dates != NO_DATE
+        if '$gte' in match['date']:
+            keep &= dates >= np.datetime64(match['date']['$gte'], 'ms')
+        if '$lte' in match['date']:
+            keep &= dates <= np.datetime64(match['date']['$lte'], 'ms')
+        return years, weeks, keep
+
+    def _slice(self, rows: np.ndarray, cells, fields=('price_sum', 'count', 'min_price', 'max_price')):
+        years, weeks, keep = cells
+        mesh = np.ix_(rows, years, weeks)
+        empty = {'price_sum': 0, 'count': 0, 'min_price': np.inf, 'max_price': -np.inf}
+        blocks = [getattr(self, field)[mesh] for field in fields]
+        if keep is None:
+            return blocks
+        return [np.where(keep, block, empty[field]) for field, block in zip(fields, blocks)]
+
+    def search(self, match: dict, after: dict | None = None, limit: int | None = None) -> list:
+        rows, cells = self._rows(match), self._cells(match)
+        if after is not None:
+            rows = self._after(rows, after)
+
+        hits, prices = [], []
+        chunk = max(limit or 0, SEARCH_CHUNK)
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            price_sum, count = self._slice(block, cells, ('price_sum', 'count'))
+            weeks = (count > 0).sum(axis=(1, 2))
+            present = np.flatnonzero(weeks)
+            if limit is not None:
+                present = present[:limit - len(hits)]
+            price_sum, count = price_sum[present], count[present]
+            weekly_mean = np.divide(price_sum, count, out=np.zeros_like(price_sum), where=count > 0)
+            hits.extend(block[present])
+            prices.extend(weekly_mean.sum(axis=(1, 2)) / weeks[present])
+            if limit is not None and len(hits) >= limit:
+                break
+
+        labels = [self.labels[axis] for axis in AXES]
+        results = []
+        for row, price in zip(hits, prices):
+            name, region, point_type, quality, unit = (labels[axis][p] for axis, p in enumerate(self.coordinates[:, row]))
+            results.append({
+                'name': name,
+                'category': self.groups.get(name),
+                'region': region,
+                'quality': quality,
+                'point_type': point_type,
+                'unit': unit,
+                'price': float(price)
+            })
+        return results
+
+    def history(self, match: dict) -> list:
+        cells = self._cells(match)
+        price_sum, count, min_price, max_price = self._slice(self._rows(match), cells)
+        total_sum, total_count = price_sum.sum(axis=0), count.sum(axis=0)
+        lowest, highest = min_price.min(axis=0, initial=np.inf), max_price.max(axis=0, initial=-np.inf)
+
+        years, weeks, _ = cells
+        results = []
+        for year, week in zip(*np.nonzero(total_count)):
+            results.append({
+                'week': int(weeks[week]) + 1,
+                'date': self._date(years[year], weeks[week]),
+                'mean_price': float(total_sum[year, week] / total_count[year, week]),
+                'min_price': float(lowest[year, week]),
+                'max_price': float(highest[year, week])
+            })
+        return sorted(results, key=lambda point: point['week'], reverse=True)
+
+    def per_region(self, match: dict) -> list:
+        rows, cells = self._rows(match), self._cells(match)
+        price_sum, count, min_price, max_price = self._slice(rows, cells)
+        years, weeks, _ = cells
+        labels = [self.labels[axis] for axis in AXES]
+        series = {}
+        for hit in zip(*np.nonzero(count)):
+            row, year, week = hit
+            _, region, point_type, quality, unit = self.coordinates[:, rows[row]]
+            year_position, week_position = years[year], weeks[week]
+            series.setdefault((labels[1][region], labels[3][quality], labels[4][unit]), []).append({
+                'point_type': labels[2][point_type],
+                'year': self.year_labels[year_position],
+                'week': int(week_position) + 1,
+                'date': self._date(year_position, week_position),
+                'min_price': float(min_price[hit]),
+                'mean_price': float(price_sum[hit] / count[hit]),
+                'max_price': float(max_price[hit])
+            })
+        return [{
+            'region': region,
+            'quality': quality,
+            'unit': unit,
+            'history': sorted(points, key=lambda point: (point['year'], point['week']), reverse=True)
+        } for (region, quality, unit), points in series.items()]
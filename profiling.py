@@ -0,0 +1,83 @@
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+import bson
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self, profile):
+        self.profile = profile
+
+    def started(self, event):
+        self.profile.round_trips += 1
+        self.profile.bytes_sent += len(bson.encode(event.command))
+        self.profile.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class IngestionProfile:
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.commands = Counter()
+        self.listener = CommandCounter(self)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def report(self, rows: int, elapsed: float, batch_size: int, chunk_size: int | None) -> dict:
+        return {
+            'rows': rows,
+            'batch_size': batch_size,
+            'chunk_size': chunk_size,
+            'wall_time': elapsed,
+            'rows_per_sec': rows / elapsed if elapsed else 0.0,
+            'phases': dict(self.phases),
+            'round_trips': self.round_trips,
+            'bytes_sent': self.bytes_sent,
+            'commands': dict(self.commands),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(profile: IngestionProfile | None, name: str):
+    return nullcontext() if profile is None else profile.phase(name)
+
+
+def timed_iter(profile: IngestionProfile | None, name: str, iterable):
+    iterator = iter(iterable)
+    while True:
+        with timed(profile, name):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
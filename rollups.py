@@ -0,0 +1,145 @@
+from datetime import datetime
+
+from enums import region_zone_dict
+from harvest_index import HarvestIndex
+from pipeline_utils import storage_pipeline
+
+WEEKLY_PRICES_KEY = ['product_name', 'region', 'point_type', 'quality', 'unit', 'year', 'week']
+SNAPSHOT_SERIES_KEY = ['product_name', 'group', 'region', 'point_type', 'quality', 'unit']
+
+
+def weekly_prices_pipeline(weeks=None):
+    pipeline = []
+    if weeks:
+        pipeline.append({
+            '$match': {
+                '$or': [{'year': year, 'week': week} for year, week in sorted(weeks)]
+            }
+        })
+    pipeline.extend([
+        {
+            '$group': {
+                '_id': {key: f'${key}' for key in WEEKLY_PRICES_KEY},
+                'group': {
+                    '$first': '$group'
+                },
+                'date': {
+                    '$min': '$date'
+                },
+                'min_price': {
+                    '$min': '$min_price'
+                },
+                'mean_price': {
+                    '$avg': '$mean_price'
+                },
+                'max_price': {
+                    '$max': '$max_price'
+                },
+                'price_sum': {
+                    '$sum': '$mean_price'
+                },
+                'count': {
+                    '$sum': 1
+                }
+            }
+        }, {
+            '$project': {
+                '_id': 0,
+                **{key: f'$_id.{key}' for key in WEEKLY_PRICES_KEY},
+                'group': 1,
+                'date': 1,
+                'min_price': 1,
+                'mean_price': 1,
+                'max_price': 1,
+                'price_sum': 1,
+                'count': 1
+            }
+        }, {
+            '$merge': {
+                'into': 'weekly_prices',
+                'on': WEEKLY_PRICES_KEY,
+                'whenMatched': 'replace',
+                'whenNotMatched': 'insert'
+            }
+        }
+    ])
+    return pipeline
+
+
+def refresh_weekly_prices(db, weeks=None):
+    db['history'].aggregate(storage_pipeline('history', weekly_prices_pipeline(weeks)), allowDiskUse=True)
+
+
+def month_bounds(year: int, month: int) -> tuple:
+    upper = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return datetime(year, month, 1), upper
+
+
+def seasonal_snapshot_pipeline(year: int, month: int) -> list:
+    date_lower, date_upper = month_bounds(year, month)
+    return [
+        {
+            '$match': {
+                'date': {
+                    '$gte': date_lower,
+                    '$lt': date_upper
+                }
+            }
+        }, {
+            '$sort': {
+                'date': -1
+            }
+        }, {
+            '$group': {
+                '_id': {key: f'${key}' for key in SNAPSHOT_SERIES_KEY},
+                'history': {
+                    '$push': {
+                        'date': '$date',
+                        'week': '$week',
+                        'mean_price': {
+                            '$divide': ['$price_sum', '$count']
+                        },
+                        'min_price': '$min_price',
+                        'max_price': '$max_price'
+                    }
+                }
+            }
+        }, {
+            '$sort': {f'_id.{key}': 1 for key in SNAPSHOT_SERIES_KEY}
+        }
+    ]
+
+
+def refresh_seasonal_snapshots(db, months=None):
+    if not months:
+        months = {(doc['_id']['year'], doc['_id']['month']) for doc in db['weekly_prices'].aggregate([
+            {'$group': {'_id': {'year': {'$year': '$date'}, 'month': {'$month': '$date'}}}}
+        ])}
+    harvest_index = HarvestIndex.load(db)
+
+    for year, month in sorted(months):
+        snapshots = {region: [] for region in region_zone_dict}
+        for doc in db['weekly_prices'].aggregate(seasonal_snapshot_pipeline(year, month), allowDiskUse=True):
+            series = doc['_id']
+            zone = region_zone_dict.get(series['region'])
+            if zone is None or not harvest_index.is_in_season(series['product_name'], zone, month):
+                continue
+            snapshots[series['region']].append({
+                'name': series['product_name'],
+                'category': series['group'],
+                'region': series['region'],
+                'point_type': series['point_type'],
+                'quality': series['quality'],
+                'unit': series['unit'],
+                'history': doc['history']
+            })
+        for region, series in snapshots.items():
+            db['seasonal_snapshot'].replace_one({'region': region, 'year': year, 'month': month}, {
+                'region': region,
+                'zone': region_zone_dict[region],
+                'year': year,
+                'month': month,
+                'products': sorted({item['name'] for item in series}),
+                'series': series,
+                'built_at': datetime.utcnow()
+            }, upsert=True)
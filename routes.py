@@ -1,153 +1,182 @@
-from datetime import datetime, timezone, date, timedelta
+from datetime import datetime, date
 
-from fastapi import APIRouter, Body, Request, Response, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, Request, Response, HTTPException, status, Path, Query
 from fastapi.encoders import jsonable_encoder
-from typing import List, Annotated
+from typing import Dict, List, Annotated
 
+import database
+from cache import cached
+from pagination import paginated, decode_page_token, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from serialization import fast_json
 import models
 import pipeline_utils
-from models import Food, FoodDateAndPrice, FoodSeries, HarvestFoods, FoodPricesInRegion
+from models import CatalogFood, Food, FoodDateAndPrice, FoodSeries, HarvestFoods, FoodPricesInRegion, BasketHistoryRequest
 import enums
 
 router = APIRouter()
 
+POINT_KEYS = {
+    'year': '$year',
+    'week': '$week',
+    'date': '$date'
+}
 
-@router.get("/", response_description="Get all foods", response_model=List[Food])
-def get_foods(request: Request):
-    return request.app.database["foods"].find()
+PRODUCT_SERIES_KEYS = {
+    'name': '$product_name',
+    'category': '$group',
+    'region': '$region',
+    'point_type': '$point_type',
+    'unit': '$unit',
+    'quality': '$quality'
+}
+
+SEARCH_ORDER = {
+    'name': 1,
+    'region': 1,
+    'point_type': 1,
+    'quality': 1,
+    'unit': 1
+}
+
+LATEST_FIRST = {
+    'year': -1,
+    'week': -1,
+    'date': -1
+}
+
+PRICE_ACCUMULATORS = {
+    'min_price': {
+        '$min': '$min_price'
+    },
+    'mean_price': {
+        '$avg': '$mean_price'
+    },
+    'max_price': {
+        '$max': '$max_price'
+    }
+}
+
+WEEKLY_PRICE_ACCUMULATORS = {
+    'date': {
+        '$min': '$date'
+    },
+    'price_sum': {
+        '$sum': '$price_sum'
+    },
+    'count': {
+        '$sum': '$count'
+    },
+    'min_price': {
+        '$min': '$min_price'
+    },
+    'max_price': {
+        '$max': '$max_price'
+    }
+}
+
+
+def date_bounds(date_from: Annotated[str | None, Query(description='YYYY-MM-DD or ISO week YYYY-Www')] = None,
+                date_to: Annotated[str | None, Query(description='YYYY-MM-DD or ISO week YYYY-Www')] = None) -> tuple:
+    try:
+        return (pipeline_utils.parse_date_bound(date_from) if date_from else None,
+                pipeline_utils.parse_date_bound(date_to, end=True) if date_to else None)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid date bound')
+
+
+def recent_dates(dates: tuple) -> tuple:
+    if dates == (None, None):
+        return pipeline_utils.recent_weeks_start(), None
+    return dates
+
+
+def resolve_product(request: Request, product_name: str) -> dict:
+    food = request.app.catalog.resolve(product_name)
+    if food is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product '{product_name}'")
+    return food
+
+
+@router.get("/", response_description="Get all foods", response_model=List[CatalogFood])
+@fast_json(List[CatalogFood])
+@paginated(['_id'])
+@cached('get_foods')
+async def get_foods(request: Request,
+                    response: Response,
+                    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                    page_token: Annotated[str | None, Query(alias='page_token')] = None):
+    after = decode_page_token(page_token, ['_id'])
+    pipeline = [
+        {'$match': {'_id': {'$gt': after['_id']}} if after else {}},
+        {'$sort': {'_id': 1}},
+        {'$limit': limit},
+        {'$project': {'_id': 1, 'name': '$product_name', 'category': '$group'}}
+    ]
+    return await database.aggregate(request, 'foods', pipeline)
 
 
 @router.get("/foods_search/year/{year_val}/",
             response_description="Food list by specified parameters.",
             response_model=List[Food])
-def advanced_food_search(request: Request,
-                         year_val: int,
-                         region_id: Annotated[int | None, Query(alias='region')] = None,
-                         group_id: Annotated[int | None, Query(alias='category')] = None,
-                         week_from: Annotated[int | None, Query(alias="week_gte")] = None,
-                         week_to: Annotated[int | None, Query(alias="week_lte")] = None,
-                         quality_val: Annotated[int | None, Query(alias="quality")] = None,
-                         store_type_id: Annotated[int | None, Query(alias="store")] = None,
-                         unit_id: Annotated[int | None, Query(alias='unit_metric')] = None,
-                         in_season: Annotated[bool | None, Query(alias='in_season')] = None):
-    pipeline = pipeline_utils.generate_history_pipeline(year_val=year_val,
-                                                        region_id=region_id,
-                                                        quality_val=quality_val,
-                                                        store_id=store_type_id,
-                                                        week_from=week_from,
-                                                        week_to=week_to,
-                                                        unit_id=unit_id)
-    pipeline.extend([
-        {
-            '$lookup': {
-                'from': 'foods',
-                'localField': 'food_id',
-                'foreignField': '_id',
-                'as': 'food'
-            }
-        }, {
-            '$unwind': {
-                'path': '$food',
-                'preserveNullAndEmptyArrays': False
-            }
-        }
-    ])
-    if group_id is not None:
-        pipeline.append(
-            {
-                '$match': {
-                    'food.group': enums.category_dict[group_id].value
-                }
-            })
-    pipeline.extend([
-        {
-            '$group': {
-                '_id': {
-                    'name': '$food.product_name',
-                    'group': '$food.group',
-                    'region': '$region',
-                    'quality': '$quality',
-                    'point_type': '$point_type',
-                    'unit': '$unit',
-                    'week': '$week',
-                    'date': '$date'
-                },
-                'mean_price': {
-                    '$avg': '$mean_price'
-                }
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$_id.name',
-                    'region': '$_id.region',
-                    'quality': '$_id.quality',
-                    'point_type': '$_id.point_type',
-                    'category': '$_id.group',
-                    'unit': '$_id.unit'
-                },
-                'series': {
-                    '$push': {
-                        'week': '$_id.week',
-                        'date': '$_id.date',
-                        'mean_price': '$mean_price',
-                    }
-                }
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'name': '$_id.name',
-                'category': '$_id.category',
-                'quality': '$_id.quality',
-                'point_type': '$_id.point_type',
-                'region': '$_id.region',
-                'unit': '$_id.unit',
-                'price': {
-                    '$avg': '$series.mean_price'
-                }
-            }
-        }
-    ])
-
+@fast_json(List[Food])
+@paginated(list(SEARCH_ORDER))
+@cached('advanced_food_search')
+async def advanced_food_search(request: Request,
+                               response: Response,
+                               year_val: int,
+                               region_id: Annotated[int | None, Query(alias='region')] = None,
+                               group_id: Annotated[int | None, Query(alias='category')] = None,
+                               week_from: Annotated[int | None, Query(alias="week_gte")] = None,
+                               week_to: Annotated[int | None, Query(alias="week_lte")] = None,
+                               quality_val: Annotated[int | None, Query(alias="quality")] = None,
+                               store_type_id: Annotated[int | None, Query(alias="store")] = None,
+                               unit_id: Annotated[int | None, Query(alias='unit_metric')] = None,
+                               in_season: Annotated[bool | None, Query(alias='in_season')] = None,
+                               dates: Annotated[tuple, Depends(date_bounds)] = (None, None),
+                               limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+                               page_token: Annotated[str | None, Query(alias='page_token')] = None):
+    after = decode_page_token(page_token, list(SEARCH_ORDER))
+    spec = pipeline_utils.HistoryFilter(year=year_val,
+                                        region_id=region_id,
+                                        quality_val=quality_val,
+                                        store_id=store_type_id,
+                                        week_from=week_from,
+                                        week_to=week_to,
+                                        unit_id=unit_id,
+                                        group_id=group_id,
+                                        date_from=dates[0],
+                                        date_to=dates[1],
+                                        product_name_from=after['name'] if after else None)
     if region_id is not None and (in_season is not None and in_season is True):
         region = enums.region_dict[region_id].value
         zone = enums.region_zone_dict[region]
         current_month = datetime.now().month
-        pipeline.extend([
-            {
-                '$lookup': {
-                    'from': 'harvest',
-                    'localField': 'name',
-                    'foreignField': 'ingredient_id',
-                    'as': 'harvest'
-                }
-            }, {
-                '$unwind': {
-                    'path': '$harvest',
-                    'preserveNullAndEmptyArrays': False
-                }
-            }, {
-                '$match': {
-                    'harvest.zone': zone,
-                    'harvest.harvest_months': current_month
-                }
-            }, {
-                '$project': {
-                    'name': '$name',
-                    'region': '$region',
-                    'quality': '$quality',
-                    'point_type': '$point_type',
-                    'category': '$category',
-                    'unit': '$unit',
-                    'price': '$price'
-                }
-            }
-        ])
-
-    result = request.app.database['history'].aggregate(pipeline)
+        spec.product_names = request.app.harvest_index.products_in_season(zone, current_month)
+
+    match = spec.to_match()
+    if request.app.price_cube is not None and request.app.price_cube.covers(match):
+        return request.app.price_cube.search(match, after=after, limit=limit)
+
+    pipeline = pipeline_utils.compile_pipeline(spec,
+                                               keys={
+                                                   'name': '$product_name',
+                                                   'category': '$group',
+                                                   'region': '$region',
+                                                   'quality': '$quality',
+                                                   'point_type': '$point_type',
+                                                   'unit': '$unit'
+                                               },
+                                               accumulators={
+                                                   'price': {
+                                                       '$avg': '$mean_price'
+                                                   }
+                                               },
+                                               sort=SEARCH_ORDER,
+                                               after=after,
+                                               limit=limit)
+
+    result = await database.aggregate(request, 'weekly_prices', pipeline)
     if result is not None:
-        result = list(result)
         return result
     raise HTTPException(status_code=404)
 
@@ -155,193 +184,106 @@ def advanced_food_search(request: Request,
 @router.get("/product/{product_name}/",
             response_description="Product's price history from the last 4 weeks.",
             response_model=List[FoodSeries])
-def get_food_history_last_weeks(request: Request,
-                                product_name: str,
-                                region_id: Annotated[int | None, Query(alias='region')] = None,
-                                quality_val: Annotated[int | None, Query(alias="quality")] = None,
-                                store_type_id: Annotated[int | None, Query(alias="store")] = None,
-                                unit_id: Annotated[int | None, Query(alias='unit_metric')] = None):
-    pipeline = pipeline_utils.generate_history_pipeline(year_val=datetime.now().year,
-                                                        region_id=region_id,
-                                                        quality_val=quality_val,
-                                                        store_id=store_type_id,
-                                                        week_from=None,
-                                                        week_to=None,
-                                                        unit_id=unit_id)
-
-    pipeline.extend([
-        {
-            '$lookup': {
-                'from': 'foods',
-                'localField': 'food_id',
-                'foreignField': '_id',
-                'as': 'food'
-            }
-        }, {
-            '$match': {
-                'food.product_name': product_name
-            }
-        }, {
-            '$unwind': {
-                'path': '$food',
-                'preserveNullAndEmptyArrays': False
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$food.product_name',
-                    'category': '$food.group',
-                    'region': '$region',
-                    'point_type': '$point_type',
-                    'unit': '$unit',
-                    'quality': '$quality',
-                    'week': '$week',
-                    'date': '$date'
-                },
-                'min_price': {
-                    '$min': '$min_price'
-                },
-                'mean_price': {
-                    '$avg': '$mean_price'
-                },
-                'max_price': {
-                    '$max': '$max_price'
-                }
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$_id.name',
-                    'category': '$_id.group',
-                    'region': '$_id.region',
-                    'point_type': '$_id.point_type',
-                    'unit': '$_id.unit',
-                    'quality': '$_id.quality'
-                },
-                'series': {
-                    '$push': {
-                        'week': '$_id.week',
-                        'date': '$_id.date',
-                        'min_price': '$min_price',
-                        'mean_price': '$mean_price',
-                        'max_price': '$max_price'
-                    }
-                }
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'name': '$_id.name',
-                'category': '$_id.group',
-                'region': '$_id.region',
-                'point_type': '$_id.point_type',
-                'unit': '$_id.unit',
-                'quality': '$_id.quality',
-                'history': '$series'
-            }
-        }
-    ])
-    print(pipeline)
-    result = request.app.database['history'].aggregate(pipeline)
+@fast_json(List[FoodSeries])
+@cached('get_food_history_last_weeks')
+async def get_food_history_last_weeks(request: Request,
+                                      product_name: str,
+                                      region_id: Annotated[int | None, Query(alias='region')] = None,
+                                      quality_val: Annotated[int | None, Query(alias="quality")] = None,
+                                      store_type_id: Annotated[int | None, Query(alias="store")] = None,
+                                      unit_id: Annotated[int | None, Query(alias='unit_metric')] = None,
+                                      dates: Annotated[tuple, Depends(date_bounds)] = (None, None)):
+    food = resolve_product(request, product_name)
+    date_from, date_to = recent_dates(dates)
+    spec = pipeline_utils.HistoryFilter(date_from=date_from,
+                                        date_to=date_to,
+                                        region_id=region_id,
+                                        quality_val=quality_val,
+                                        store_id=store_type_id,
+                                        unit_id=unit_id,
+                                        food_id=food['_id'])
+    pipeline = pipeline_utils.compile_series_pipeline(spec,
+                                                      series_keys=PRODUCT_SERIES_KEYS,
+                                                      point_keys=POINT_KEYS,
+                                                      accumulators=PRICE_ACCUMULATORS,
+                                                      sort=LATEST_FIRST)
+    result = await database.aggregate(request, 'history', pipeline)
 
     if result is not None:
-        result = list(result)
-        for r in result:
-            r['history'] = sorted(r['history'], key=lambda x: x['week'], reverse=True)
         return result
     raise HTTPException(status_code=404)
 
 
+@router.post("/products/history/",
+             response_description="Price history from the last 4 weeks for several products, keyed by product.",
+             response_model=Dict[str, List[FoodSeries]])
+@fast_json(Dict[str, List[FoodSeries]])
+@cached('get_basket_history')
+async def get_basket_history(request: Request, basket: BasketHistoryRequest):
+    foods = {}
+    for product_name in basket.products:
+        food = resolve_product(request, product_name)
+        foods[food['product_name']] = food
+    date_from, date_to = recent_dates(date_bounds(basket.date_from, basket.date_to))
+    spec = pipeline_utils.HistoryFilter(date_from=date_from,
+                                        date_to=date_to,
+                                        region_id=basket.region,
+                                        quality_val=basket.quality,
+                                        store_id=basket.store,
+                                        unit_id=basket.unit_metric,
+                                        food_id={'$in': [food['_id'] for food in foods.values()]})
+    pipeline = pipeline_utils.compile_series_pipeline(spec,
+                                                      series_keys=PRODUCT_SERIES_KEYS,
+                                                      point_keys=POINT_KEYS,
+                                                      accumulators=PRICE_ACCUMULATORS,
+                                                      sort=LATEST_FIRST)
+    result = await database.aggregate(request, 'history', pipeline)
+
+    series = {product_name: [] for product_name in foods}
+    for item in result:
+        series.setdefault(item['name'], []).append(item)
+    return series
+
+
 @router.get(
     "/per_region/product/{product_name}/",
     response_description="---.",
     response_model=List[FoodPricesInRegion])
-def testtt(request: Request,
-           product_name: str,
-           quality_val: Annotated[int | None, Query(alias="quality")] = None,
-           store_type_id: Annotated[int | None, Query(alias="store")] = None,
-           unit_id: Annotated[int | None, Query(alias='unit_metric')] = None):
-    pipeline = pipeline_utils.generate_history_pipeline(year_val=datetime.now().year,
-                                                        region_id=None,
-                                                        quality_val=quality_val,
-                                                        store_id=store_type_id,
-                                                        week_from=None,
-                                                        week_to=None,
-                                                        unit_id=unit_id)
-    pipeline.extend([
-        {
-            '$lookup': {
-                'from': 'foods',
-                'localField': 'food_id',
-                'foreignField': '_id',
-                'as': 'food'
-            }
-        }, {
-            '$match': {
-                'food.product_name': product_name
-            }
-        }, {
-            '$unwind': {
-                'path': '$food',
-                'preserveNullAndEmptyArrays': False
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$food.product_name',
-                    'category': '$food.group',
-                    'region': '$region',
-                    'point_type': '$point_type',
-                    'quality': '$quality',
-                    'unit': '$unit',
-                    'week': '$week',
-                    'date': '$date'
-                },
-                'min_price': {
-                    '$min': '$min_price'
-                },
-                'mean_price': {
-                    '$avg': '$mean_price'
-                },
-                'max_price': {
-                    '$max': '$max_price'
-                }
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$_id.name',
-                    'category': '$_id.group',
-                    'region': '$_id.region',
-                    'quality': '$_id.quality',
-                    'unit': '$_id.unit'
-                },
-                'series': {
-                    '$push': {
-                        'week': '$_id.week',
-                        'date': '$_id.date',
-                        'min_price': '$min_price',
-                        'mean_price': '$mean_price',
-                        'max_price': '$max_price'
-                    }
-                }
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'region': '$_id.region',
-                'quality': '$_id.quality',
-                'unit': '$_id.unit',
-                'history': '$series'
-            }
-        }
-    ])
-    result = request.app.database['history'].aggregate(pipeline)
+@fast_json(List[FoodPricesInRegion])
+@cached('testtt')
+async def testtt(request: Request,
+                 product_name: str,
+                 quality_val: Annotated[int | None, Query(alias="quality")] = None,
+                 store_type_id: Annotated[int | None, Query(alias="store")] = None,
+                 unit_id: Annotated[int | None, Query(alias='unit_metric')] = None,
+                 dates: Annotated[tuple, Depends(date_bounds)] = (None, None)):
+    food = resolve_product(request, product_name)
+    date_from, date_to = recent_dates(dates)
+    spec = pipeline_utils.HistoryFilter(date_from=date_from,
+                                        date_to=date_to,
+                                        quality_val=quality_val,
+                                        store_id=store_type_id,
+                                        unit_id=unit_id,
+                                        product_name=food['product_name'])
+    match = spec.to_match()
+    if request.app.price_cube is not None and request.app.price_cube.covers(match):
+        return request.app.price_cube.per_region(match)
+
+    pipeline = pipeline_utils.compile_series_pipeline(spec,
+                                                      series_keys={
+                                                          'region': '$region',
+                                                          'quality': '$quality',
+                                                          'unit': '$unit'
+                                                      },
+                                                      point_keys={
+                                                          'point_type': '$point_type',
+                                                          **POINT_KEYS
+                                                      },
+                                                      accumulators=PRICE_ACCUMULATORS,
+                                                      sort=LATEST_FIRST)
+    result = await database.aggregate(request, 'weekly_prices', pipeline)
 
     if result is not None:
-        result = list(result)
-        for r in result:
-            r['history'] = sorted(r['history'], key=lambda x: x['week'], reverse=True)
         return result
     raise HTTPException(status_code=404)
 
@@ -349,66 +291,51 @@ def testtt(request: Request,
 @router.get("/year/{year_val}/product/{product_name}/",
             response_description="Product's price history from the last 4 weeks.",
             response_model=List[FoodDateAndPrice])
-def get_food_history(request: Request,
-                     year_val: int,
-                     product_name: str,
-                     region_id: Annotated[int | None, Query(alias='region')] = None,
-                     week_from: Annotated[int | None, Query(alias="week_gte")] = None,
-                     week_to: Annotated[int | None, Query(alias="week_lte")] = None,
-                     quality_val: Annotated[int | None, Query(alias="quality")] = None,
-                     store_type_id: Annotated[int | None, Query(alias="store")] = None):
-    pipeline = pipeline_utils.generate_history_pipeline(year_val=year_val,
-                                                        region_id=region_id,
-                                                        quality_val=quality_val,
-                                                        store_id=store_type_id,
-                                                        week_from=week_from,
-                                                        week_to=week_to)
-    pipeline.extend([{
-        '$lookup': {
-            'from': 'foods',
-            'localField': 'food_id',
-            'foreignField': '_id',
-            'as': 'food'
-        }
-    }, {
-        '$unwind': {
-            'path': '$food',
-            'preserveNullAndEmptyArrays': False
-        }
-    }, {
-        '$match': {
-            'food.product_name': product_name
-        }
-    }, {
-        '$group': {
-            '_id': {
-                'week': '$week',
-                'date': '$date'
-            },
-            'mean_price': {
-                '$avg': '$mean_price'
-            },
-            'min_price': {
-                '$min': '$min_price'
-            },
-            'max_price': {
-                '$max': '$max_price'
-            },
-        }
-    }, {
-        '$project': {
-            '_id': 0,
-            'week': '$_id.week',
-            'date': '$_id.date',
-            'mean_price': '$mean_price',
-            'min_price': '$min_price',
-            'max_price': '$max_price'
-        }
-    }])
-
-    result = request.app.database['history'].aggregate(pipeline)
+@fast_json(List[FoodDateAndPrice])
+@cached('get_food_history')
+async def get_food_history(request: Request,
+                           year_val: int,
+                           product_name: str,
+                           region_id: Annotated[int | None, Query(alias='region')] = None,
+                           week_from: Annotated[int | None, Query(alias="week_gte")] = None,
+                           week_to: Annotated[int | None, Query(alias="week_lte")] = None,
+                           quality_val: Annotated[int | None, Query(alias="quality")] = None,
+                           store_type_id: Annotated[int | None, Query(alias="store")] = None,
+                           dates: Annotated[tuple, Depends(date_bounds)] = (None, None)):
+    food = resolve_product(request, product_name)
+    spec = pipeline_utils.HistoryFilter(year=year_val,
+                                        region_id=region_id,
+                                        quality_val=quality_val,
+                                        store_id=store_type_id,
+                                        week_from=week_from,
+                                        week_to=week_to,
+                                        date_from=dates[0],
+                                        date_to=dates[1],
+                                        product_name=food['product_name'])
+    match = spec.to_match()
+    if request.app.price_cube is not None and request.app.price_cube.covers(match):
+        return request.app.price_cube.history(match)
+
+    pipeline = pipeline_utils.compile_pipeline(spec,
+                                               keys={
+                                                   'year': '$year',
+                                                   'week': '$week'
+                                               },
+                                               accumulators=WEEKLY_PRICE_ACCUMULATORS,
+                                               project={
+                                                   'week': '$week',
+                                                   'date': '$date',
+                                                   'mean_price': {
+                                                       '$divide': ['$price_sum', '$count']
+                                                   },
+                                                   'min_price': '$min_price',
+                                                   'max_price': '$max_price'
+                                               },
+                                               sort=LATEST_FIRST)
+
+    result = await database.aggregate(request, 'weekly_prices', pipeline)
     if result is not None:
-        return list(result)
+        return result
     raise HTTPException(status_code=404)
 
 
@@ -416,158 +343,32 @@ def get_food_history(request: Request,
     "/seasonal/month/{month_val}/region/{region_id}",
     response_description="Foods that are in season.",
     response_model=List[FoodSeries])
-def get_foods_in_season(request: Request,
-                        month_val: int,
-                        region_id: int):
-    current_date = datetime.today()
-    date_lower = datetime(current_date.year, month_val, 1, 0, 0, 0)
-    date_upper = datetime(current_date.year, month_val + 1, 1, 0, 0, 0) - timedelta(days=1)
-    region = enums.region_dict[region_id].value
-    zone = enums.region_zone_dict[region]
-    pipeline = [
-        {
-            '$match': {
-                'date': {
-                    '$gte': datetime(2023, 10, 1, 0, 0, 0, tzinfo=timezone.utc),
-                    '$lte': datetime(2023, 10, 31, 0, 0, 0, tzinfo=timezone.utc)
-                }
-            }
-        }, {
-            '$match': {
-                'region': region
-            }
-        }, {
-            '$lookup': {
-                'from': 'foods',
-                'localField': 'food_id',
-                'foreignField': '_id',
-                'as': 'food'
-            }
-        }, {
-            '$unwind': {
-                'path': '$food',
-                'preserveNullAndEmptyArrays': False
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$food.product_name',
-                    'group': '$food.group',
-                    'week': {
-                        '$week': '$date'
-                    },
-                    'date': '$date'
-                },
-                'min_price': {
-                    '$min': '$min_price'
-                },
-                'mean_price': {
-                    '$avg': '$mean_price'
-                },
-                'max_price': {
-                    '$max': '$max_price'
-                }
-            }
-        }, {
-            '$group': {
-                '_id': {
-                    'name': '$_id.name',
-                    'category': '$_id.group'
-                },
-                'series': {
-                    '$push': {
-                        'week': '$_id.week',
-                        'date': '$_id.date',
-                        'min_price': '$min_price',
-                        'mean_price': '$mean_price',
-                        'max_price': '$max_price'
-                    }
-                }
-            }
-        }, {
-            '$lookup': {
-                'from': 'harvest',
-                'localField': '_id.name',
-                'foreignField': 'ingredient_id',
-                'as': 'harvest'
-            }
-        }, {
-            '$unwind': {
-                'path': '$harvest',
-                'preserveNullAndEmptyArrays': False
-            }
-        }, {
-            '$match': {
-                'harvest.zone': zone,
-                'harvest.harvest_months': month_val
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'name': '$_id.name',
-                'category': '$_id.category',
-                'series': '$series'
-            }
-        }
-    ]
-    print(pipeline)
-    result = request.app.database['history'].aggregate(pipeline)
-
-    if result is not None:
-        result = list(result)
-        for item in result:
-            item['series'] = sorted(item['series'], key=lambda x: x['week'], reverse=True)
-        return result
-    raise HTTPException(status_code=404)
+@fast_json(List[FoodSeries])
+@cached('get_foods_in_season')
+async def get_foods_in_season(request: Request,
+                              month_val: Annotated[int, Path(ge=1, le=12)],
+                              region_id: int,
+                              year_val: Annotated[int | None, Query(alias='year')] = None):
+    if region_id not in enums.region_dict:
+        raise HTTPException(status_code=404, detail=f"Unknown region '{region_id}'")
+    snapshots = await database.find(request, 'seasonal_snapshot',
+                                     {'region': enums.region_dict[region_id].value,
+                                      'year': year_val or datetime.today().year,
+                                      'month': month_val},
+                                     {'_id': 0, 'series': 1},
+                                     limit=1)
+    return snapshots[0]['series'] if snapshots else []
 
 
 @router.get(
     "/seasonal/zone/{zone_id}/harvest_months",
     response_description="Foods in a certain zone and during harvest.",
     response_model=HarvestFoods)
-def get_foods_in_zone(request: Request,
-                      zone: enums.Zone,
-                      harvest_months: int):
-    pipeline = [
-        {
-            '$match': {
-                'zone': zone.value
-            }
-        }, {
-            '$lookup': {
-                'from': 'foods',
-                'localField': 'ingredient_id',
-                'foreignField': 'product_name',
-                'as': 'food'
-            }
-        }, {
-            '$unwind': {
-                'path': '$food',
-                'preserveNullAndEmptyArrays': False
-            }
-        }, {
-            '$match': {
-                'harvest_months': harvest_months
-            }
-        }, {
-            '$group': {
-                '_id': None,
-                'names': {
-                    '$push': '$food.product_name'
-                }
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'foods': '$names'
-            }
-        }
-    ]
-
-    print(pipeline)
-    result = request.app.database['harvest'].aggregate(pipeline)
-
-    if result is not None:
-        result = list(result)
-        return result[0]
-    raise HTTPException(status_code=404)
+@cached('get_foods_in_zone')
+async def get_foods_in_zone(request: Request,
+                            zone: enums.Zone,
+                            harvest_months: int):
+    products = request.app.harvest_index.products_in_season(zone.value, harvest_months)
+    result = await database.find(request, 'foods', {'product_name': {'$in': products}},
+                                 {'_id': 0, 'product_name': 1})
+    return {'foods': [food['product_name'] for food in result]}
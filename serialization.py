@@ -0,0 +1,83 @@
+import datetime
+import types
+import typing
+from functools import lru_cache, wraps
+
+import orjson
+from bson import ObjectId
+from dotenv import dotenv_values
+from fastapi import Response
+from pydantic import BaseModel
+
+config = dotenv_values(".env")
+
+STRICT_VALIDATION = config.get("STRICT_VALIDATION", "false").lower() == "true"
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+def _identity(value):
+    return value
+
+
+def _to_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def _to_int(value):
+    return int(value) if isinstance(value, float) else value
+
+
+def _to_float(value):
+    return float(value) if isinstance(value, int) else value
+
+
+SCALARS = {
+    datetime.date: _to_date,
+    int: _to_int,
+    float: _to_float,
+}
+
+
+@lru_cache(maxsize=None)
+def shaper(annotation):
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin in (list, typing.List):
+        shape_item = shaper(args[0])
+        return lambda values: [shape_item(value) for value in values]
+    if origin in (dict, typing.Dict):
+        shape_value = shaper(args[1])
+        return lambda values: {key: shape_value(value) for key, value in values.items()}
+    if origin in (typing.Union, types.UnionType):
+        shape_value = shaper(next(arg for arg in args if arg is not type(None)))
+        return lambda value: None if value is None else shape_value(value)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        fields = [(name, field.alias or name, shaper(field.annotation))
+                  for name, field in annotation.model_fields.items()]
+        return lambda document: {key: shape(document.get(name)) for name, key, shape in fields}
+    return SCALARS.get(annotation, _identity)
+
+
+def fast_json(model):
+    shape = shaper(model)
+
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            result = await endpoint(*args, **kwargs)
+            if STRICT_VALIDATION:
+                return result
+            response = Response(orjson.dumps(shape(result), default=_default), media_type='application/json')
+            if 'response' in kwargs:
+                for name, value in kwargs['response'].headers.items():
+                    if name != 'content-length':
+                        response.headers[name] = value
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from bson import json_util
+from pymongo.errors import PyMongoError
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        return {name: normalize(item) for name, item in value.items()}
+    if isinstance(value, list):
+        items = [normalize(item) for item in value]
+        return items if any(isinstance(item, (dict, list)) for item in items) else ['?']
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    if isinstance(value, int) and value in (0, 1, -1):
+        return value
+    return '?'
+
+
+def _find(plan, key: str):
+    if isinstance(plan, dict):
+        if key in plan:
+            yield plan[key]
+        for value in plan.values():
+            yield from _find(value, key)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _find(value, key)
+
+
+def summarize_explain(plan: dict) -> dict:
+    stats = next(_find(plan, 'executionStats'), {})
+    return {
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_returned': stats.get('nReturned'),
+        'execution_ms': stats.get('executionTimeMillis'),
+        'indexes': sorted(set(_find(plan, 'indexName'))),
+        'collection_scan': 'COLLSCAN' in str(plan.get('queryPlanner', plan))
+    }
+
+
+class SlowQueryRecorder:
+    def __init__(self, route: str, threshold_ms: float = 500.0, explain_rate: float = 0.1,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.route = route
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.backups = backups
+        self.logger = logging.getLogger(f'slow_queries.{route}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(route, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def is_slow(self, duration_ms: float) -> bool:
+        return duration_ms >= self.threshold_ms
+
+    def should_explain(self) -> bool:
+        return random.random() < self.explain_rate
+
+    def record(self, request, collection: str, pipeline: list, duration_ms: float, returned: int,
+               plan: dict | None = None):
+        route = request.scope.get('route')
+        entry = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'route': route.path if route is not None else request.url.path,
+            'params': {**request.path_params, **request.query_params},
+            'collection': collection,
+            'duration_ms': round(duration_ms, 2),
+            'returned': returned,
+            'pipeline': normalize(pipeline)
+        }
+        if plan is not None:
+            entry['explain'] = summarize_explain(plan)
+        self.logger.info(json_util.dumps(entry, ensure_ascii=False))
+
+    def explain_and_record(self, request, collection: str, pipeline: list, duration_ms: float, returned: int):
+        try:
+            plan = request.app.database.command('explain', {'aggregate': collection, 'pipeline': pipeline,
+                                                            'cursor': {}}, verbosity='executionStats')
+        except PyMongoError:
+            plan = None
+        self.record(request, collection, pipeline, duration_ms, returned, plan)
+
+    def read(self, limit: int = 100, route: str | None = None) -> list:
+        entries = []
+        for suffix in [''] + [f'.{backup}' for backup in range(1, self.backups + 1)]:
+            if not os.path.exists(self.route + suffix):
+                continue
+            with open(self.route + suffix, encoding='utf-8') as log_file:
+                lines = log_file.readlines()
+            for line in reversed(lines):
+                entry = json.loads(line)
+                if route is None or entry['route'] == route:
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        return entries
+        return entries
+
+
+def create_recorder(config):
+    threshold_ms = float(config.get('SLOW_QUERY_MS', 500))
+    if threshold_ms < 0:
+        return None
+    return SlowQueryRecorder(config.get('SLOW_QUERY_LOG', 'slow_queries.jsonl'),
+                             threshold_ms=threshold_ms,
+                             explain_rate=float(config.get('SLOW_QUERY_EXPLAIN_RATE', 0.1)),
+                             max_bytes=int(config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                             backups=int(config.get('SLOW_QUERY_LOG_BACKUPS', 5)))
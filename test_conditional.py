@@ -0,0 +1,40 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+import conditional
+import pipeline_utils
+from conditional import _not_modified_since, entity_tag
+
+UPDATED_AT = datetime(2026, 10, 17, 12, 0, 0, 500, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('Sat, 17 Oct 2026 12:00:00 GMT', True),
+    ('Sat, 17 Oct 2026 11:59:59 GMT', False),
+    ('Sat, 17 Oct 2099 20:04:54 -0000', True),
+    ('Sat, 17 Oct 2099 20:04:54', True),
+    ('Sat, 17 Oct 2000 20:04:54 -0000', False),
+    ('not a date', False),
+])
+def test_not_modified_since(header, expected):
+    assert _not_modified_since(header, UPDATED_AT) is expected
+
+
+def test_entity_tag_changes_with_the_default_window():
+    assert entity_tag(3, '/product/ajo/', b'b=2&a=1', '2026-10-12') == entity_tag(3, '/product/ajo/', b'a=1&b=2',
+                                                                                  '2026-10-12')
+    assert entity_tag(3, '/product/ajo/', b'', '2026-10-12') != entity_tag(3, '/product/ajo/', b'', '2026-10-19')
+
+
+def test_window_start_is_the_latest_week_or_month_boundary(monkeypatch):
+    class Today(date):
+        @classmethod
+        def today(cls):
+            return cls(2026, 10, 2)
+
+    monkeypatch.setattr(conditional, 'date', Today)
+    monkeypatch.setattr(pipeline_utils, 'date', Today)
+    assert conditional.window_start() == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    Today.today = classmethod(lambda cls: cls(2026, 10, 14))
+    assert conditional.window_start() == datetime(2026, 10, 12, tzinfo=timezone.utc)
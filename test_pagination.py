@@ -0,0 +1,25 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from pagination import decode_page_token, encode_page_token
+
+
+def test_page_token_round_trip():
+    values = {'_id': ObjectId(), 'name': 'Limón'}
+    assert decode_page_token(encode_page_token(values), ['_id', 'name']) == values
+
+
+def test_missing_token_means_first_page():
+    assert decode_page_token(None, ['_id']) is None
+
+
+@pytest.mark.parametrize('token', [
+    'not base64 !',
+    encode_page_token({'name': 'Ajo'}),
+    encode_page_token({'_id': {'$gt': 1}}),
+])
+def test_invalid_tokens_are_rejected(token):
+    with pytest.raises(HTTPException) as error:
+        decode_page_token(token, ['_id'])
+    assert error.value.status_code == 400
@@ -0,0 +1,193 @@
+from datetime import datetime
+
+import pytest
+
+import pipeline_utils
+from pipeline_utils import HistoryFilter, compile_pipeline, compile_series_pipeline, keyset_predicate
+
+PRICE_ACCUMULATORS = {
+    'min_price': {'$min': '$min_price'},
+    'mean_price': {'$avg': '$mean_price'},
+    'max_price': {'$max': '$max_price'}
+}
+
+
+def stage_names(pipeline):
+    return [next(iter(stage)) for stage in pipeline]
+
+
+def test_to_match_merges_all_predicates_into_one_document():
+    spec = HistoryFilter(year=2024, week_from=3, week_to=9, region_id=4, store_id=3, quality_val=1, unit_id=1,
+                         group_id=1, product_name='Limón')
+    assert spec.to_match() == {
+        'year': 2024,
+        'week': {'$gte': 3, '$lte': 9},
+        'region': 'Región Metropolitana de Santiago',
+        'point_type': 'Feria libre',
+        'quality': 'Primera',
+        'unit': '$/kilo',
+        'product_name': 'Limón',
+        'group': 'Frutas'
+    }
+
+
+def test_to_match_defaults_to_recent_weeks_when_only_year_is_given():
+    current_week = datetime.today().isocalendar()[1]
+    assert HistoryFilter(year=2024).to_match() == {'year': 2024, 'week': {'$gte': current_week - 4}}
+    assert HistoryFilter(year=2024, recent_weeks=2).to_match()['week'] == {'$gte': current_week - 2}
+
+
+def test_to_match_keeps_explicit_week_bounds():
+    assert HistoryFilter(year=2024, week_to=10).to_match()['week'] == {'$lte': 10}
+
+
+def test_to_match_date_range_replaces_the_recent_week_default():
+    date_from, date_to = datetime(2023, 12, 1), datetime(2024, 1, 31)
+    assert HistoryFilter(year=2024, date_from=date_from, date_to=date_to).to_match() == {
+        'year': 2024,
+        'date': {'$gte': date_from, '$lte': date_to}
+    }
+    assert HistoryFilter(date_from=date_from).to_match() == {'date': {'$gte': date_from}}
+
+
+def test_to_match_without_filters_is_empty():
+    assert HistoryFilter().to_match() == {}
+
+
+def test_to_match_product_names_and_lower_bound_share_one_predicate():
+    spec = HistoryFilter(product_names=['Ajo', 'Palta'], product_name_from='B')
+    assert spec.to_match() == {'product_name': {'$in': ['Ajo', 'Palta'], '$gte': 'B'}}
+    assert HistoryFilter(product_name_from='B').to_match() == {'product_name': {'$gte': 'B'}}
+
+
+def test_to_match_exact_product_name_wins_over_list_and_lower_bound():
+    spec = HistoryFilter(product_name='Ajo', product_names=['Palta'], product_name_from='B')
+    assert spec.to_match() == {'product_name': 'Ajo'}
+
+
+def test_to_match_food_id_accepts_operators():
+    assert HistoryFilter(food_id={'$in': [1, 2]}).to_match() == {'food_id': {'$in': [1, 2]}}
+
+
+def test_compile_pipeline_stage_order_and_projection():
+    spec = HistoryFilter(year=2024, week_from=1, week_to=53)
+    pipeline = compile_pipeline(spec, keys={'name': '$product_name', 'region': '$region'},
+                                accumulators={'price': {'$avg': '$mean_price'}}, sort={'name': 1, 'region': 1},
+                                limit=10)
+    assert stage_names(pipeline) == ['$match', '$group', '$sort', '$limit', '$project']
+    assert pipeline[0] == {'$match': {'year': 2024, 'week': {'$gte': 1, '$lte': 53}}}
+    assert pipeline[1] == {'$group': {'_id': {'name': '$product_name', 'region': '$region'},
+                                      'price': {'$avg': '$mean_price'}}}
+    assert pipeline[2] == {'$sort': {'_id.name': 1, '_id.region': 1}}
+    assert pipeline[3] == {'$limit': 10}
+    assert pipeline[4] == {'$project': {'_id': 0, 'name': '$_id.name', 'region': '$_id.region', 'price': '$price'}}
+
+
+def test_compile_pipeline_without_sort_or_limit():
+    pipeline = compile_pipeline(HistoryFilter(year=2024, week_from=1), keys={'week': '$week'},
+                                accumulators=PRICE_ACCUMULATORS)
+    assert stage_names(pipeline) == ['$match', '$group', '$project']
+
+
+def test_compile_pipeline_sort_ignores_fields_outside_the_group_key():
+    pipeline = compile_pipeline(HistoryFilter(year=2024, week_from=1), keys={'year': '$year', 'week': '$week'},
+                                accumulators=PRICE_ACCUMULATORS, sort={'year': -1, 'week': -1, 'date': -1})
+    assert pipeline[2] == {'$sort': {'_id.year': -1, '_id.week': -1}}
+
+
+def test_compile_pipeline_resolves_group_keys_inside_custom_projections():
+    pipeline = compile_pipeline(HistoryFilter(year=2024, week_from=1), keys={'year': '$year', 'week': '$week'},
+                                accumulators={'price_sum': {'$sum': '$price_sum'}, 'count': {'$sum': '$count'}},
+                                project={'week': '$week', 'mean_price': {'$divide': ['$price_sum', '$count']}})
+    assert pipeline[-1] == {'$project': {'_id': 0, 'week': '$_id.week',
+                                         'mean_price': {'$divide': ['$price_sum', '$count']}}}
+
+
+def test_compile_series_pipeline_sorts_points_before_pushing_them():
+    pipeline = compile_series_pipeline(HistoryFilter(year=2024, week_from=1),
+                                       series_keys={'name': '$product_name'},
+                                       point_keys={'year': '$year', 'week': '$week'},
+                                       accumulators=PRICE_ACCUMULATORS,
+                                       series_field='series',
+                                       sort={'year': -1, 'week': -1})
+    assert stage_names(pipeline) == ['$match', '$group', '$sort', '$group', '$project']
+    assert pipeline[1]['$group']['_id'] == {'name': '$product_name', 'year': '$year', 'week': '$week'}
+    assert pipeline[2] == {'$sort': {'_id.year': -1, '_id.week': -1}}
+    assert pipeline[3] == {'$group': {
+        '_id': {'name': '$_id.name'},
+        'series': {'$push': {'year': '$_id.year', 'week': '$_id.week', 'min_price': '$min_price',
+                             'mean_price': '$mean_price', 'max_price': '$max_price'}}
+    }}
+    assert pipeline[4] == {'$project': {'_id': 0, 'name': '$_id.name', 'series': '$series'}}
+
+
+def test_compile_series_pipeline_without_sort():
+    pipeline = compile_series_pipeline(HistoryFilter(year=2024, week_from=1), series_keys={'name': '$product_name'},
+                                       point_keys={'week': '$week'}, accumulators=PRICE_ACCUMULATORS)
+    assert stage_names(pipeline) == ['$match', '$group', '$group', '$project']
+    assert 'history' in pipeline[2]['$group']
+
+
+def test_keyset_predicate_expands_into_one_branch_per_sort_key():
+    predicate = keyset_predicate({'name': 1, 'region': 1, 'year': -1}, {'name': 'Ajo', 'region': 'R', 'year': 2024})
+    assert predicate == {'$or': [
+        {'name': {'$gt': 'Ajo'}},
+        {'name': 'Ajo', 'region': {'$gt': 'R'}},
+        {'name': 'Ajo', 'region': 'R', 'year': {'$lt': 2024}}
+    ]}
+
+
+def test_storage_pipeline_is_a_no_op_without_timeseries(monkeypatch):
+    monkeypatch.setattr(pipeline_utils, 'HISTORY_TIMESERIES', False)
+    pipeline = [{'$match': {'region': 'R'}}]
+    assert pipeline_utils.storage_pipeline('history', pipeline) is pipeline
+
+
+@pytest.fixture
+def timeseries(monkeypatch):
+    monkeypatch.setattr(pipeline_utils, 'HISTORY_TIMESERIES', True)
+
+
+def test_storage_pipeline_rewrites_meta_fields(timeseries):
+    pipeline = [
+        {'$match': {'year': 2024, 'region': 'R', '$or': [{'product_name': 'Ajo'}, {'week': 3}]}},
+        {'$sort': {'product_name': 1, 'date': -1}},
+        {'$project': {'_id': 0, 'date': 1, 'region': 1, 'label': '$unit', 'variable': '$$ROOT'}},
+    ]
+    assert pipeline_utils.storage_pipeline('history', pipeline) == [
+        {'$match': {'year': 2024, 'meta.region': 'R', '$or': [{'meta.product_name': 'Ajo'}, {'week': 3}]}},
+        {'$sort': {'meta.product_name': 1, 'date': -1}},
+        {'$project': {'_id': 0, 'date': 1, 'region': '$meta.region', 'label': '$meta.unit', 'variable': '$$ROOT'}},
+    ]
+
+
+def test_storage_pipeline_stops_at_the_first_shape_changing_stage(timeseries):
+    pipeline = compile_pipeline(HistoryFilter(year=2024, week_from=1, region_id=1), keys={'region': '$region'},
+                                accumulators={'price': {'$avg': '$mean_price'}}, sort={'region': 1})
+    compiled = pipeline_utils.storage_pipeline('history', pipeline)
+    assert compiled[0] == {'$match': {'year': 2024, 'week': {'$gte': 1},
+                                      'meta.region': 'Región de Arica y Parinacota'}}
+    assert compiled[1] == {'$group': {'_id': {'region': '$meta.region'}, 'price': {'$avg': '$mean_price'}}}
+    assert compiled[2:] == pipeline[2:]
+
+
+def test_storage_pipeline_leaves_other_collections_alone(timeseries):
+    pipeline = [{'$match': {'region': 'R'}}]
+    assert pipeline_utils.storage_pipeline('weekly_prices', pipeline) is pipeline
+
+
+def test_compile_pipeline_pushes_the_keyset_predicate_into_the_leading_match():
+    spec = HistoryFilter(year=2024, week_from=1, product_name_from='Ajo')
+    pipeline = compile_pipeline(spec, keys={'name': '$product_name', 'region': '$region'},
+                                accumulators={'price': {'$avg': '$mean_price'}}, sort={'name': 1, 'region': 1},
+                                after={'name': 'Ajo', 'region': 'R'}, limit=10)
+    assert stage_names(pipeline) == ['$match', '$group', '$sort', '$limit', '$project']
+    assert pipeline[0] == {'$match': {
+        'year': 2024,
+        'week': {'$gte': 1},
+        'product_name': {'$gte': 'Ajo'},
+        '$or': [
+            {'product_name': {'$gt': 'Ajo'}},
+            {'product_name': 'Ajo', 'region': {'$gt': 'R'}}
+        ]
+    }}